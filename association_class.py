@@ -0,0 +1,392 @@
+# General imports
+# ---------------
+import numpy as np
+from scipy.sparse import csr_matrix
+from bokeh.io import show
+from bokeh.plotting import figure
+from bokeh.models import ColumnDataSource
+from bokeh.palettes import brewer
+from bokeh.transform import linear_cmap
+from store_class import column_codes
+from tally_class import column_headers, checkbox_matrix
+
+def onehot_matrix(pd, columns, checkbox_columns = []):
+    """
+    Goal:
+    -----
+    One-hot encode the answers of the closed questions in one sparse matrix
+    (respondents x answers), the answers of a question forming a block of columns
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    columns: closed question columns
+    checkbox_columns: columns of ticked boxes, for which a missing answer is a box not ticked
+                      (for the other columns missing answers are left out)
+
+    Ouput:
+    -----
+    onehot_mat: sparse matrix of the answers (respondents x answers)
+    starts: first answer column of each question (and total number of answer columns)
+    levels: list of (column, answer) of each answer column
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    row_list, col_list, levels = [], [], []
+    starts = [0]
+    for column in columns:
+        codes, table = column_codes(pd, column)
+        codes = np.asarray(codes, dtype = int)
+        keep = np.ones(codes.size, dtype = bool)
+        table = list(table)
+
+        if None in table and column not in checkbox_columns:
+            pos = table.index(None)
+            keep = codes != pos
+            codes = codes - (codes > pos)
+            table.pop(pos)
+
+        # keep at least one (empty) answer column per question
+        if not table: table = [None]
+
+        row_list.append(np.flatnonzero(keep))
+        col_list.append(starts[-1] + codes[keep])
+        levels += [(column, val) for val in table]
+        starts.append(starts[-1] + len(table))
+
+    rows, cols = np.concatenate(row_list), np.concatenate(col_list)
+    onehot_mat = csr_matrix((np.ones(rows.size), (rows, cols)), shape = (codes.size, starts[-1]))
+
+    return onehot_mat, np.array(starts), levels
+
+
+def association_matrix(pd, columns, checkbox_columns = []):
+    """
+    Goal:
+    -----
+    Compute the association between all pairs of closed questions: every contingency
+    table comes from one sparse product of the one-hot answers (see onehot_matrix),
+    the chi-square and Cramér's V of all pairs are then computed on the blocks
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    columns: closed question columns
+    checkbox_columns: columns of ticked boxes (see onehot_matrix)
+
+    Ouput:
+    -----
+    cramer_mat: Cramér's V of each pair of questions
+    chi2_mat: chi-square of each pair of questions
+    num_mat: number of respondents answering both questions
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    onehot_mat, starts, levels = onehot_matrix(pd, columns, checkbox_columns = checkbox_columns)
+    block_starts = starts[:-1]
+    question_of = np.repeat(np.arange(len(columns)), np.diff(starts))
+
+    # all contingency tables (answers x answers)
+    count_mat = (onehot_mat.T @ onehot_mat).toarray()
+
+    # margins of each answer within each pair of questions
+    row_sums = np.add.reduceat(count_mat, block_starts, axis = 1)
+    col_sums = np.add.reduceat(count_mat, block_starts, axis = 0)
+    num_mat = np.add.reduceat(row_sums, block_starts, axis = 0)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        expect_mat = row_sums[:,question_of]*col_sums[question_of,:]/num_mat[question_of][:,question_of]
+        chi2_terms = np.where(expect_mat > 0, (count_mat - expect_mat)**2/expect_mat, 0)
+    chi2_mat = np.add.reduceat(np.add.reduceat(chi2_terms, block_starts, axis = 0), block_starts, axis = 1)
+
+    # number of answers given in each pair of questions
+    num_rows = np.add.reduceat((row_sums > 0).astype(int), block_starts, axis = 0)
+    num_cols = np.add.reduceat((col_sums > 0).astype(int), block_starts, axis = 1)
+    dof_mat = np.minimum(num_rows, num_cols) - 1
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        cramer_mat = np.where((dof_mat > 0) & (num_mat > 0), np.sqrt(chi2_mat/(num_mat*dof_mat)), np.nan)
+
+    return cramer_mat, chi2_mat, num_mat
+
+
+def association_plot(value_mat, names, cmap, title = 'title', txt_format = '{:1.2f}', high = 1, show_plot = False):
+    """
+    Goal:
+    -----
+    Plot heat map figure of the association between all pairs of questions
+
+    Input:
+    -----
+    value_mat: association of each pair of questions (e.g. Cramér's V, see association_matrix)
+    names: short names of the questions
+    cmap: colormap
+    title: title of the figure
+    txt_format: format of the values written in the cells
+    high: value of the darkest color
+    show_plot: if False (default) do not show the figure
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    names = np.array(names)
+    num_question = names.size
+
+    # basic settings
+    val_bar = 30
+    plot_width = max(1000, val_bar*num_question + 250)
+    plot_height = val_bar*num_question + 250
+
+    txt_val = np.array([txt_format.format(val) if np.isfinite(val) else "" for val in value_mat.ravel()])
+    dict_ds = dict( x_val = np.tile(names, num_question),
+                    y_val = np.repeat(names, num_question),
+                    value = np.nan_to_num(value_mat.ravel()),
+                    txt_val = txt_val)
+
+    source = ColumnDataSource(data = dict_ds)
+    fig = figure(x_range = list(names), y_range = list(names[::-1]), plot_width = plot_width,
+                 plot_height = plot_height, title = title, x_axis_location = 'above')
+
+    palette = tuple(brewer[cmap][9][::-1])
+    fig.rect(x = 'x_val', y = 'y_val', width = 1, height = 1, line_color = (255,255,255),
+             fill_color = linear_cmap('value', palette, low = 0, high = high), source = source)
+    fig.text(x = 'x_val', y = 'y_val',text = 'txt_val',text_font_style = 'normal', text_font_size = '7pt',text_align = 'center',text_baseline = 'middle',source = source)
+
+    fig.xaxis.axis_label = '';                          fig.toolbar_location = None;
+    fig.yaxis.axis_label = '';                          fig.grid.grid_line_color = None;
+    fig.axis.minor_tick_in = 0;                         fig.axis.minor_tick_out = 0;
+    fig.axis.major_tick_in = 0;                         fig.axis.major_tick_out = 0;
+    fig.outline_line_alpha = 0;                         fig.background_fill_color = (255,255,255);
+    fig.axis.major_label_text_font_style = 'italic';    fig.axis.major_label_text_font_size = '8pt';
+    fig.axis.axis_line_color = None;                    fig.title.text_font_size = '10pt';
+    fig.xaxis.major_label_orientation = np.pi/2;        fig.x_range.range_padding = 0;
+    fig.y_range.range_padding = 0;
+
+    if show_plot:
+        show(fig)
+
+    return fig
+
+
+def cooccurrence_matrix(pd, columns, rep = 'X', mask = None):
+    """
+    Goal:
+    -----
+    Count how often the options of a multiple choice block are ticked together,
+    with one product of the boolean matrix of the block
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    columns: columns of the block
+    rep: value of a ticked box
+    mask: boolean array of the respondents to count (see filter_class), default: all
+
+    Ouput:
+    -----
+    cooc_mat: number of respondents ticking both options (options x options,
+              the diagonal being the number of respondents ticking each option)
+    num_resp: number of respondents ticking at least one option
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    selected = checkbox_matrix(pd, columns, rep = rep)
+    if mask is not None:
+        selected = selected[mask]
+    selected = selected.astype(np.float64)
+    cooc_mat = np.rint(selected.T @ selected).astype(int)
+    num_resp = int(selected.any(axis = 1).sum())
+
+    return cooc_mat, num_resp
+
+
+def frequent_sets(pd, columns, min_support, max_size = None, rep = 'X', mask = None):
+    """
+    Goal:
+    -----
+    Find the sets of options of a multiple choice block ticked together by at least
+    min_support respondents (apriori). The ticked options of each respondent are packed
+    in one integer, so that the support of all the candidate sets of a size is counted
+    at once over the distinct answer patterns.
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    columns: columns of the block (at most 64)
+    min_support: minimum number of respondents ticking all the options of a set
+    max_size: maximum number of options per set (default: no maximum)
+    rep: value of a ticked box
+    mask: boolean array of the respondents to count (see filter_class), default: all
+
+    Ouput:
+    -----
+    sets: list of (tuple of column indices, support) sorted by decreasing support
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    columns = list(columns)
+    selected = checkbox_matrix(pd, columns, rep = rep)
+    if mask is not None:
+        selected = selected[mask]
+
+    # distinct answer patterns and their number of respondents
+    option_bits = np.left_shift(np.uint64(1), np.arange(len(columns), dtype = np.uint64))
+    patterns, num_patterns = np.unique(np.bitwise_or.reduce(np.where(selected, option_bits, np.uint64(0)), axis = 1), return_counts = True)
+
+    sets = []
+    candidates = option_bits
+    set_size = 1
+    while candidates.size and (max_size is None or set_size <= max_size):
+        contained = (patterns[:,np.newaxis] & candidates[np.newaxis,:]) == candidates[np.newaxis,:]
+        support = num_patterns @ contained
+        frequent = candidates[support >= min_support]
+        sets += [(tuple([columns[opt_num] for opt_num in range(len(columns)) if int(cand) >> opt_num & 1]), int(sup))
+                 for cand, sup in zip(frequent, support[support >= min_support])]
+
+        # candidates of the next size: unions of two frequent sets
+        unions = np.unique((frequent[:,np.newaxis] | frequent[np.newaxis,:]).ravel())
+        union_size = ((unions[:,np.newaxis] >> np.arange(len(columns), dtype = np.uint64)) & np.uint64(1)).sum(axis = 1)
+        candidates = unions[union_size == set_size + 1]
+        set_size += 1
+
+    return sorted(sets, key = lambda item: -item[1])
+
+
+def cooccurrence_plot(pd, columns, cmap, names = None, title = 'title', rep = 'X', mask = None, show_plot = False):
+    """
+    Goal:
+    -----
+    Plot heat map figure of the options of a multiple choice block ticked together
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    columns: columns of the block
+    cmap: colormap
+    names: short names of the options (default: column headers)
+    title: title of the figure
+    rep: value of a ticked box
+    mask: boolean array of the respondents to count (see filter_class), default: all
+    show_plot: if False (default) do not show the figure
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if names is None: names = np.array(column_headers(pd))[list(columns)]
+    cooc_mat, num_resp = cooccurrence_matrix(pd, columns, rep = rep, mask = mask)
+
+    # share of the respondents ticking at least one option
+    ratio_mat = cooc_mat/max(num_resp, 1)
+    fig = association_plot(ratio_mat*100, names, cmap, title = '{} (n = {:1.0f})'.format(title, num_resp),
+                           txt_format = '{:1.0f} %', high = max(ratio_mat.max()*100, 1), show_plot = show_plot)
+
+    return fig
+
+
+def frequent_sets_plot(pd, columns, min_support, cmap, names = None, title = 'title', max_sets = 15, max_size = None, rep = 'X', mask = None, show_plot = False):
+    """
+    Goal:
+    -----
+    Plot figure of the most frequent sets of options ticked together (see frequent_sets)
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    columns: columns of the block
+    min_support: minimum number of respondents ticking all the options of a set
+    cmap: colormap
+    names: short names of the options (default: column headers)
+    title: title of the figure
+    max_sets: maximum number of sets drawn
+    max_size: maximum number of options per set (default: no maximum)
+    rep: value of a ticked box
+    mask: boolean array of the respondents to count (see filter_class), default: all
+    show_plot: if False (default) do not show the figure
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    columns = list(columns)
+    if names is None: names = np.array(column_headers(pd))[columns]
+    name_dict = dict(zip(columns, names))
+
+    sets = [item for item in frequent_sets(pd, columns, min_support, max_size = max_size, rep = rep, mask = mask) if len(item[0]) > 1][:max_sets]
+    cooc_mat, num_resp = cooccurrence_matrix(pd, columns, rep = rep, mask = mask)
+
+    cat_array = np.array([' + '.join([name_dict[column] for column in cols]) for cols, support in sets][::-1])
+    sum_array = np.array([support for cols, support in sets][::-1])
+    ratio_array = sum_array/max(num_resp, 1)
+
+    # basic settings
+    plot_width = 1000
+    val_bar = 30
+    plot_height = val_bar*max(cat_array.size, 1) + 40
+    bar_height = 0.8
+    x_range = (0, 1.5)
+
+    txt_val = np.array(["  {:1.0f} % (n = {:1.0f})".format(ratio*100,num) for ratio,num in zip(ratio_array,sum_array)])
+    color = np.array(brewer[cmap][6])[[-2]*cat_array.size]
+
+    dict_ds = dict( x_val = ratio_array,
+                    y_val = cat_array,
+                    txt_val = txt_val,
+                    color = color)
+
+    source = ColumnDataSource(data = dict_ds)
+    fig = figure(x_range = x_range, y_range = list(cat_array), plot_width = plot_width,
+                 plot_height = plot_height,title = title)
+
+    fig.hbar(y = 'y_val', left = 0, right = 'x_val', height = bar_height, color = 'color', source = source)
+    fig.text(x = 'x_val', y = 'y_val',text = 'txt_val',text_font_style = 'normal', text_font_size = '10pt',text_align = 'left',text_baseline = 'middle',source = source)
+
+    fig.xaxis.axis_label = '';                          fig.toolbar_location = None;
+    fig.yaxis.axis_label = '';                          fig.grid.grid_line_color = None;
+    fig.axis.minor_tick_in = 0;                         fig.axis.minor_tick_out = 0;
+    fig.axis.major_tick_in = 0;                         fig.axis.major_tick_out = 0;
+    fig.outline_line_alpha = 0;                         fig.background_fill_color = (255,255,255);
+    fig.axis.major_label_text_font_style = 'italic';    fig.yaxis.major_label_text_font_size = '10pt';
+    fig.outline_line_alpha = 0;                         fig.xaxis.major_label_text_font_size = '0pt';
+    fig.axis.axis_line_color = None;                    fig.title.text_font_size = '10pt';
+    fig.y_range.range_padding = 0;
+
+    if show_plot:
+        show(fig)
+
+    return fig
@@ -0,0 +1,292 @@
+# General imports
+# ---------------
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import hashlib
+import socketserver
+from collections import OrderedDict
+from pandas.util import hash_pandas_object
+from bokeh.io.export import get_screenshot_as_png, get_svgs
+from bokeh.io.webdriver import webdriver_control
+from bokeh.layouts import column
+from bokeh.models import Plot
+import plot_class
+from filter_class import build_index, answer, select_and, to_mask
+from tally_class import read_data, count_columns
+from store_class import build_store
+from export_class import stack_svgs
+
+plot_names = ['category_plot', 'calendar_plot', 'time_grid_plot', 'free_question_plot',
+              'quality_plot', 'quality_plot2', 'likert_summary_plot']
+
+class RenderServer(socketserver.UnixStreamServer):
+    """
+    Goal:
+    -----
+    Local render daemon keeping the survey data warm between the requests (see serve):
+    the parsed data, its binary store, the tally of all the respondents and the segment
+    index are kept per data hash, with the rendered outputs and the export browser
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    def __init__(self, socket_path, load_data, cache_size = 64, state_size = 2):
+        self.load_data = load_data
+        self.cache_size = cache_size
+        self.state_size = state_size
+        self.states = OrderedDict()
+        self.cache = OrderedDict()
+        self.driver = None
+        self.stop = False
+        self.reload()
+        super().__init__(socket_path, RenderHandler)
+
+    def reload(self):
+        pd = self.load_data()
+        self.data_hash = hashlib.sha1(hash_pandas_object(pd, index = False).to_numpy().tobytes()).hexdigest()
+
+        # parse, store and count the data once per version of the data
+        if self.data_hash not in self.states:
+            self.states[self.data_hash] = dict( pd = pd,
+                                                store = build_store(pd, max_values = 256),
+                                                tally = dict(header = list(pd), counts = count_columns(pd), num_rows = len(pd)),
+                                                index = dict(num_rows = len(pd), bitmaps = {}))
+            if len(self.states) > self.state_size:
+                self.states.popitem(last = False)
+        self.states.move_to_end(self.data_hash)
+
+    def segment_mask(self, segment):
+        if not segment:
+            return None
+
+        # index the segment columns once
+        state = self.states[self.data_hash]
+        new_columns = [int(col) for col, values in segment if int(col) not in state['index']['bitmaps']]
+        if new_columns:
+            state['index']['bitmaps'].update(build_index(state['pd'], new_columns)['bitmaps'])
+
+        return to_mask(state['index'], select_and(*[answer(state['index'], int(col), values) for col, values in segment]))
+
+    def render(self, request):
+        jobs = request['jobs'] if request['action'] == 'report' else [request]
+        out_format = request.get('format', 'png')
+        state = self.states[self.data_hash]
+        mask = self.segment_mask(request.get('segment'))
+
+        figs, tallies = [], []
+        for job in jobs:
+            if job['plot'] not in plot_names:
+                raise ValueError('unknown plot function: {}'.format(job['plot']))
+            kwargs = dict(job.get('kwargs', {}), mask = mask, results = tallies)
+            plot_func = getattr(plot_class, job['plot'])
+
+            # counts of all the respondents from the tally, of a segment from the store codes
+            if mask is None and kwargs.get('weights') is None:
+                kwargs['tally'] = state['tally']
+            try:
+                result = plot_func(state['store'], **kwargs)
+            except KeyError:
+                # question not in the store: from the data
+                result = plot_func(state['pd'], **kwargs)
+            results = result if isinstance(result, tuple) else (result,)
+            figs += [fig for fig in results if isinstance(fig, Plot)]
+
+        if out_format == 'json':
+            return json.dumps(tallies, ensure_ascii = False).encode('utf-8')
+
+        if self.driver is None:
+            self.driver = webdriver_control.create()
+
+        if out_format == 'svg':
+            for fig in figs:
+                fig.output_backend = 'svg'
+            return stack_svgs(figs, get_svgs(column(figs), driver = self.driver)).encode('utf-8')
+
+        if out_format == 'png':
+            image = get_screenshot_as_png(column(figs), driver = self.driver)
+            buffer = io.BytesIO()
+            image.save(buffer, format = 'PNG')
+            return buffer.getvalue()
+
+        raise ValueError('unknown format: {}'.format(out_format))
+
+    def server_close(self):
+        super().server_close()
+        if self.driver is not None:
+            self.driver.quit()
+            self.driver = None
+
+
+class RenderHandler(socketserver.StreamRequestHandler):
+    """
+    Goal:
+    -----
+    Answer one request of the render daemon: a json line of the request, answered by
+    a json line of the status and the size of the output, followed by the output bytes
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    def handle(self):
+        server = self.server
+        start_time = time.time()
+        body = b''
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            action = request.get('action', 'render')
+            request['action'] = action
+
+            if action in ['render', 'report']:
+                key = server.data_hash + json.dumps(request, sort_keys = True)
+                if key not in server.cache:
+                    server.cache[key] = server.render(request)
+                    if len(server.cache) > server.cache_size:
+                        server.cache.popitem(last = False)
+                server.cache.move_to_end(key)
+                body = server.cache[key]
+            elif action == 'reload':
+                server.reload()
+            elif action != 'stop':
+                raise ValueError('unknown action: {}'.format(action))
+            header = dict(status = 'ok', size = len(body))
+
+        except Exception as error:
+            action = None
+            header = dict(status = 'error', message = '{}: {}'.format(type(error).__name__, error), size = 0)
+            body = b''
+
+        header['time'] = time.time() - start_time
+        self.wfile.write((json.dumps(header) + '\n').encode('utf-8'))
+        self.wfile.write(body)
+        self.wfile.flush()
+
+        if action == 'stop':
+            server.stop = True
+
+
+def serve(load_data, socket_path = 'sondage.sock', cache_size = 64):
+    """
+    Goal:
+    -----
+    Run the render daemon on a unix socket until a stop request. The data is loaded once and
+    its binary store, tally and segment index are kept per data hash: the figures of all the
+    respondents are drawn from the tally and the segments from the store codes, without
+    reading or counting the data again. The export browser is started at the first png or
+    svg request and kept open, and the last outputs are kept in memory per data hash.
+    Requests (one json line, see request):
+    - dict(action = 'render', plot = 'category_plot', kwargs = dict(column = 0, ...), format = 'png', segment = [[3, ['value']]])
+    - dict(action = 'report', jobs = [dict(plot = ..., kwargs = ...), ...], format = 'png', segment = ...)
+    - dict(action = 'reload') to reload the data (kept as is if its hash did not change), dict(action = 'stop') to stop the daemon
+    format being 'png', 'svg' or 'json' (tallies, see tally_class.record_tally) and segment
+    the [column, answers] pairs the respondents must all match.
+
+    Input:
+    -----
+    load_data: function without argument returning the pandas dataframe
+    socket_path: file of the unix socket
+    cache_size: number of outputs kept in memory
+
+    Ouput:
+    -----
+    none
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    server = RenderServer(socket_path, load_data, cache_size = cache_size)
+    try:
+        while not server.stop:
+            server.handle_request()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def request(message, socket_path = 'sondage.sock'):
+    """
+    Goal:
+    -----
+    Send a request to the render daemon (see serve)
+
+    Input:
+    -----
+    message: dictionary of the request
+    socket_path: file of the unix socket
+
+    Ouput:
+    -----
+    header: dictionary of the status, the size of the output and the render time
+    body: bytes of the output (png, svg or json)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        stream = sock.makefile('rwb')
+        stream.write((json.dumps(message, ensure_ascii = False) + '\n').encode('utf-8'))
+        stream.flush()
+        header = json.loads(stream.readline().decode('utf-8'))
+        body = stream.read(header['size'])
+
+    if header['status'] != 'ok':
+        raise RuntimeError(header['message'])
+
+    return header, body
+
+
+if __name__ == '__main__':
+    # command line client, e.g.:
+    # python daemon_class.py serve --data data.csv &
+    # python daemon_class.py render category_plot --kwargs '{"column": 0, "order": [5,2,0,4,3,1], "cmap": "YlOrRd"}' --output age.png
+    parser = argparse.ArgumentParser(description = 'render daemon of the poll figures')
+    parser.add_argument('action', choices = ['serve', 'render', 'report', 'reload', 'stop'])
+    parser.add_argument('plot', nargs = '?', help = 'plot function (render)')
+    parser.add_argument('--socket', default = 'sondage.sock', help = 'file of the unix socket')
+    parser.add_argument('--data', default = 'data.csv', help = 'csv file of the poll (serve)')
+    parser.add_argument('--kwargs', default = '{}', help = 'json arguments of the plot function (render)')
+    parser.add_argument('--jobs', help = 'json file of the list of dict(plot = ..., kwargs = ...) (report)')
+    parser.add_argument('--segment', default = '[]', help = 'json list of [column, answers] (render, report)')
+    parser.add_argument('--format', default = 'png', choices = ['png', 'svg', 'json'])
+    parser.add_argument('--output', help = 'output file (default: standard output)')
+    args = parser.parse_args()
+
+    if args.action == 'serve':
+        serve(lambda: read_data(args.data), socket_path = args.socket)
+        sys.exit()
+
+    message = dict(action = args.action, format = args.format, segment = json.loads(args.segment))
+    if args.action == 'render':
+        message.update(plot = args.plot, kwargs = json.loads(args.kwargs))
+    elif args.action == 'report':
+        with open(args.jobs, 'r', encoding = 'utf-8') as f:
+            message.update(jobs = json.load(f))
+
+    header, body = request(message, socket_path = args.socket)
+    if args.output is not None:
+        with open(args.output, 'wb') as f:
+            f.write(body)
+    else:
+        sys.stdout.buffer.write(body)
+    sys.stderr.write('{} bytes in {:1.3f} s\n'.format(header['size'], header['time']))
@@ -0,0 +1,175 @@
+# General imports
+# ---------------
+import numpy as np
+from pandas import DataFrame, Series, CategoricalDtype, factorize
+from pandas.api.types import is_object_dtype, is_string_dtype
+from pandas.util import hash_pandas_object, hash_array
+from tally_class import fold_texts
+
+def row_keys(pd, ignore_columns = [], normalize = True):
+    """
+    Goal:
+    -----
+    Hash each row of the data in one pass over the columns. Each column is factorized and
+    only its distinct answers are normalized (case, accents and spaces ignored), so that
+    near-exact repeats share a key; the rows of answer codes are then hashed.
+
+    Input:
+    -----
+    pd: pandas dataframe
+    ignore_columns: columns left out of the key (e.g. submission time)
+    normalize: if True (default) hash the normalized answers, else the raw answers
+
+    Ouput:
+    -----
+    key_array: uint64 key of each row
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    keep_columns = [column for column in range(pd.shape[1]) if column not in ignore_columns]
+
+    code_dict = {}
+    for col_num, column in enumerate(keep_columns):
+        answer = pd.iloc[:, column]
+        codes, uniques = factorize(answer)
+        if normalize and len(uniques) and (is_object_dtype(answer.dtype) or is_string_dtype(answer.dtype) or isinstance(answer.dtype, CategoricalDtype)):
+            # normalize the distinct answers only, then code the rows by normalized answer
+            norm_uniques = fold_texts(Series(np.asarray(uniques, dtype = object))).str.strip().str.replace(r'\s+', ' ', regex = True)
+            norm_codes = factorize(norm_uniques)[0]
+            codes = np.where(codes >= 0, norm_codes[np.maximum(codes, 0)], -1)
+        code_dict[col_num] = codes
+
+    return hash_pandas_object(DataFrame(code_dict), index = False).to_numpy()
+
+
+def email_keys(pd, email_columns = [118,132]):
+    """
+    Goal:
+    -----
+    Hash the normalized email of each respondent (first email column filled)
+
+    Input:
+    -----
+    pd: pandas dataframe
+    email_columns: columns of the emails
+
+    Ouput:
+    -----
+    key_array: uint64 key of each row
+    has_email: boolean array of the rows with an email
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    emails = Series([None]*len(pd), index = pd.index, dtype = object)
+    for column in email_columns:
+        emails = emails.fillna(pd.iloc[:, column].astype(object))
+    emails = emails.str.strip().str.lower()
+    emails = emails.mask(emails == '')
+    has_email = emails.notna().to_numpy()
+
+    key_array = np.zeros(len(pd), dtype = np.uint64)
+    key_array[has_email] = hash_array(('mail:' + emails[has_email]).to_numpy(dtype = object))
+
+    return key_array, has_email
+
+
+def find_duplicates(pd, email_columns = [118,132], ignore_columns = [], keep = 'last', order_column = None, report = True):
+    """
+    Goal:
+    -----
+    Flag the repeated submissions: same email, or same normalized answers for the
+    respondents without email, keeping one submission per respondent. The keys are
+    hashed in one pass and grouped by hash, so that no pair of rows is compared. The
+    empty submissions without email are each kept as a separate respondent.
+
+    Input:
+    -----
+    pd: pandas dataframe
+    email_columns: columns of the emails
+    ignore_columns: columns left out of the row keys (e.g. submission time)
+    keep: submission kept: 'last' (default) or 'first' in the order of the rows (or of order_column),
+          'complete' for the one with the most answers
+    order_column: column giving the submission order (e.g. time), default: order of the rows
+    report: if True (default) print the number of rows removed
+
+    Ouput:
+    -----
+    mask: boolean array of the rows kept (can be given as mask to the plot functions)
+    duplicates: dictionary of the group of each row (group), of the number of exact
+                repeats (num_exact) and of rows removed (num_removed)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    exact_keys = row_keys(pd, ignore_columns = ignore_columns, normalize = False)
+    near_keys = row_keys(pd, ignore_columns = ignore_columns + list(email_columns), normalize = True)
+    mail_keys, has_email = email_keys(pd, email_columns = email_columns)
+
+    # one group per email, or per normalized answers without email
+    group_array = factorize(np.where(has_email, mail_keys, near_keys))[0]
+
+    # empty submissions without email are not one respondent
+    near_columns = [column for column in range(pd.shape[1]) if column not in ignore_columns + list(email_columns)]
+    alone = ~has_email & ~pd.iloc[:, near_columns].notna().any(axis = 1).to_numpy()
+    group_array[alone] = group_array.max(initial = -1) + 1 + np.arange(alone.sum())
+    group_array = factorize(group_array)[0]
+
+    if keep == 'complete':
+        score_array = pd.notna().sum(axis = 1).to_numpy()
+    elif order_column is not None:
+        score_array = factorize(pd.iloc[:, order_column], sort = True)[0]
+    else:
+        score_array = np.arange(len(pd))
+    if keep == 'first':
+        score_array = -score_array
+
+    # best submission of each group (the last row among the ties)
+    scores = DataFrame(dict(group = group_array, score = score_array))
+    kept = scores.iloc[::-1].groupby('group', sort = False)['score'].idxmax().to_numpy()
+    mask = np.zeros(len(pd), dtype = bool)
+    mask[kept] = True
+
+    num_exact = len(pd) - np.unique(exact_keys).size
+    num_removed = len(pd) - mask.sum()
+    if report:
+        print('{} rows: {} exact repeats, {} repeated submissions removed (same email or normalized answers, keep = {})'.format(
+              len(pd), num_exact, num_removed, keep))
+
+    return mask, dict(group = group_array, num_exact = num_exact, num_removed = num_removed)
+
+
+def drop_duplicates(pd, email_columns = [118,132], ignore_columns = [], keep = 'last', order_column = None, report = True):
+    """
+    Goal:
+    -----
+    Remove the repeated submissions of the data (see find_duplicates) before any count
+
+    Input:
+    -----
+    see find_duplicates
+
+    Ouput:
+    -----
+    pd: pandas dataframe without the repeated submissions
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    mask, duplicates = find_duplicates(pd, email_columns = email_columns, ignore_columns = ignore_columns, keep = keep,
+                                       order_column = order_column, report = report)
+
+    return pd[mask].reset_index(drop = True)
@@ -0,0 +1,406 @@
+# General imports
+# ---------------
+import os
+import re
+import json
+import zlib
+import struct
+import numpy as np
+from pandas import DataFrame
+from bokeh.io.export import get_svgs, get_screenshot_as_png
+from bokeh.layouts import column
+from bokeh.models import ColumnDataSource, CDSView, IndexFilter, GlyphRenderer
+from bokeh.resources import CDN, INLINE
+from bokeh.document import Document
+from bokeh.embed.util import OutputDocumentFor, standalone_docs_json_and_render_items
+from bokeh.core.json_encoder import serialize_json
+
+def share_sources(figs):
+    """
+    Goal:
+    -----
+    Copy the figures in a new document where the glyphs with the same data columns read
+    one shared ColumnDataSource, each glyph only seeing its own rows through a CDSView.
+    Numerical columns are kept as float32 arrays, so that they are serialized as typed
+    arrays and not as lists. The figures given are left as they are.
+
+    Input:
+    -----
+    figs: list of bokeh figures
+
+    Ouput:
+    -----
+    doc: bokeh document of the copies of the figures (same ids as the figures)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    # copies of the figures
+    with OutputDocumentFor(figs, always_new = True) as doc:
+        doc_json = doc.to_json()
+    doc = Document.from_json(doc_json)
+
+    renderers = [renderer for fig in doc.roots for renderer in fig.select(type = GlyphRenderer)
+                 if isinstance(renderer.data_source, ColumnDataSource)]
+
+    # sources in order of first use, grouped by their columns
+    groups = {}
+    for renderer in renderers:
+        source = renderer.data_source
+        numerical = dict((name, isinstance(values, np.ndarray) and values.dtype.kind in 'iuf') for name, values in source.data.items())
+        group = groups.setdefault(tuple(sorted(numerical.items())), [])
+        if not any(source is group_source for group_source in group):
+            group.append(source)
+
+    for names, sources in groups.items():
+        if not names:
+            continue
+
+        # merge the columns of the sources of the group
+        num_rows = [len(source.data[names[0][0]]) for source in sources]
+        row_start = np.concatenate([[0], np.cumsum(num_rows)])
+        data = {}
+        for name, numerical in names:
+            if numerical:
+                data[name] = np.concatenate([np.asarray(source.data[name], dtype = np.float32) for source in sources])
+            else:
+                data[name] = sum([list(source.data[name]) for source in sources], [])
+
+        if len(sources) == 1:
+            sources[0].data = data
+            continue
+
+        source_shared = ColumnDataSource(data = data)
+        for renderer in renderers:
+            source_num = [source is renderer.data_source for source in sources]
+            if not any(source_num):
+                continue
+            source_num = source_num.index(True)
+            renderer.data_source = source_shared
+            renderer.view = CDSView(source = source_shared, filters = [IndexFilter(list(range(row_start[source_num], row_start[source_num + 1])))])
+
+    return doc
+
+
+def html_report(figs, filename, title = 'sondage', sections = None, lazy = True, inline = False):
+    """
+    Goal:
+    -----
+    Save a standalone html report of the figures with one shared data table (see
+    share_sources) and BokehJS referenced once. Given sections, each section gets its
+    own document and data table, rendered when the reader scrolls to it, the data of
+    a section being only read when it is rendered.
+
+    Input:
+    -----
+    figs: list of bokeh figures
+    filename: html file name
+    title: title of the page
+    sections: list of lists of the figure index per section (default: one section of all
+              the figures, with one data table for the whole report)
+    lazy: if True (default) render the sections when they come into view
+    inline: if True put BokehJS in the file, if False (default) load it from the bokeh CDN
+
+    Ouput:
+    -----
+    none
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if sections is None:
+        sections = [list(range(len(figs)))]
+
+    # one document per section
+    section_divs = []
+    for section_num, section in enumerate(sections):
+        doc = share_sources([figs[fig_num] for fig_num in section])
+        docs_json, render_items = standalone_docs_json_and_render_items([doc])
+        item = render_items[0].to_json()
+        divs = ''.join(['<div class="bk-root" id="{}" style="min-height:{}px"></div>'.format(item['roots'][figs[fig_num].id], figs[fig_num].plot_height)
+                        for fig_num in section])
+        section_json = serialize_json(dict(docs_json = docs_json, render_items = [item])).replace('</', '<\\/')
+        section_divs.append('<div class="report-section" data-section="{num}">{divs}</div>\n'
+                            '<script type="application/json" id="report-section-{num}">{json}</script>'.format(num = section_num, divs = divs, json = section_json))
+
+    resources = INLINE if inline else CDN
+    html = """<!DOCTYPE html>
+<html lang="fr">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+{js}
+{css}
+</head>
+<body>
+{divs}
+<script type="text/javascript">
+(function() {{
+  var sections = document.querySelectorAll('.report-section');
+  function render(section) {{
+    var item = JSON.parse(document.getElementById('report-section-' + section.dataset.section).textContent);
+    Bokeh.embed.embed_items(item.docs_json, item.render_items);
+  }}
+  if ({lazy} && 'IntersectionObserver' in window) {{
+    var observer = new IntersectionObserver(function(entries) {{
+      entries.forEach(function(entry) {{
+        if (entry.isIntersecting) {{ observer.unobserve(entry.target); render(entry.target); }}
+      }});
+    }}, {{rootMargin: '400px'}});
+    sections.forEach(function(section) {{ observer.observe(section); }});
+  }} else {{
+    sections.forEach(render);
+  }}
+}})();
+</script>
+</body>
+</html>
+""".format(title = title,
+           js = resources.render_js(),
+           css = resources.render_css(),
+           divs = '\n'.join(section_divs),
+           lazy = 'true' if lazy else 'false')
+
+    with open(filename, 'w', encoding = 'utf-8') as f:
+        f.write(html)
+
+
+def stack_svgs(figs, svgs):
+    """
+    Goal:
+    -----
+    Stack the svg exports of the figures in one svg document, one figure under the other
+
+    Input:
+    -----
+    figs: list of bokeh figures
+    svgs: list of the svg exports of each figure
+
+    Ouput:
+    -----
+    svg: svg document
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    plot_width = max([fig.plot_width for fig in figs])
+    plot_height = sum([fig.plot_height for fig in figs])
+    fig_start = np.concatenate([[0], np.cumsum([fig.plot_height for fig in figs])])
+
+    svg_list = ['<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{}" height="{}">\n'.format(plot_width, plot_height)]
+    for svg, y_start in zip(svgs, fig_start):
+        svg_list.append('<g transform="translate(0,{})">{}</g>\n'.format(y_start, re.sub(r'^<\?xml[^>]*>', '', svg.strip())))
+    svg_list.append('</svg>\n')
+
+    return ''.join(svg_list)
+
+
+def export_svg(figs, names, folder = 'svg', batch_size = 8, combined_filename = None):
+    """
+    Goal:
+    -----
+    Export the figures as one svg file per question, the figures are switched to the
+    svg backend and exported by batches through one browser session
+
+    Input:
+    -----
+    figs: list of bokeh figures
+    names: list of the file names (without extension) of each figure
+    folder: folder of the svg files
+    batch_size: number of figures exported per page load
+    combined_filename: if given also save all the figures stacked in one svg file
+
+    Ouput:
+    -----
+    filenames: list of the svg files
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    os.makedirs(folder, exist_ok = True)
+    for fig in figs:
+        fig.output_backend = 'svg'
+
+    # browser imported here, so that the module loads without selenium
+    from bokeh.io.webdriver import webdriver_control
+    svgs = []
+    driver = webdriver_control.create()
+    try:
+        for batch_start in range(0, len(figs), batch_size):
+            svgs += get_svgs(column(figs[batch_start:batch_start + batch_size]), driver = driver)
+    finally:
+        driver.quit()
+
+    filenames = []
+    for svg, name in zip(svgs, names):
+        filenames.append(os.path.join(folder, '{}.svg'.format(name)))
+        with open(filenames[-1], 'w', encoding = 'utf-8') as f:
+            f.write(svg)
+
+    if combined_filename is not None:
+        with open(combined_filename, 'w', encoding = 'utf-8') as f:
+            f.write(stack_svgs(figs, svgs))
+
+    return filenames
+
+
+def export_tallies(results, filename):
+    """
+    Goal:
+    -----
+    Write the tallies kept while drawing the figures (results = ... of the plot functions,
+    see tally_class.record_tally) to filename.json (one entry per figure) and to
+    filename.parquet (one row per figure, answer and valence)
+
+    Input:
+    -----
+    results: list of the tallies
+    filename: file name of the exports (without extension)
+
+    Ouput:
+    -----
+    table: pandas dataframe written to the parquet file
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    with open(filename + '.json', 'w', encoding = 'utf-8') as f:
+        json.dump(results, f, ensure_ascii = False, indent = 1)
+
+    rows = []
+    for fig_num, result in enumerate(results):
+        rank = dict((cat_num, rank_num) for rank_num, cat_num in enumerate(result['order']))
+        valences = result['valences'] if result['valences'] is not None else [None]
+        counts = np.array(result['counts'], dtype = float).reshape(len(result['categories']), len(valences))
+        ratios = np.array(result['ratios'], dtype = float).reshape(counts.shape)
+        nums = np.broadcast_to(np.array(result['n'], dtype = float), counts.shape[:1])
+        for cat_num, cat in enumerate(result['categories']):
+            for val_num, val in enumerate(valences):
+                rows.append(dict(figure = fig_num, title = result['title'], plot = result['plot'],
+                                 category = cat, valence = val, rank = rank.get(cat_num, -1),
+                                 count = counts[cat_num, val_num], ratio = ratios[cat_num, val_num],
+                                 n = nums[cat_num]))
+
+    table = DataFrame(rows, columns = ['figure','title','plot','category','valence','rank','count','ratio','n'])
+    table.to_parquet(filename + '.parquet', index = False)
+
+    return table
+
+
+def png_chunk(chunk_type, data):
+    """
+    Goal:
+    -----
+    Build a png chunk (length, type, data and crc)
+
+    Input:
+    -----
+    chunk_type: 4 bytes type of the chunk (e.g. b'IDAT')
+    data: bytes of the chunk
+
+    Ouput:
+    -----
+    chunk: bytes of the chunk
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data) & 0xffffffff)
+
+
+def stream_png(figs, filename, width = None, background = (255,255,255), compress_level = 6):
+    """
+    Goal:
+    -----
+    Assemble the report image figure by figure: each figure is rasterized, its rows are
+    compressed and appended to the png file and it is then freed, so that the memory used
+    is the one of a single figure whatever the number of figures. The height of the image
+    is written at the end. A figure failing is skipped and reported. If no figure can be
+    rasterized, the file is removed and an error is raised.
+
+    Input:
+    -----
+    figs: iterable of bokeh figures, or of functions without argument returning a figure
+          (e.g. a generator building the figures one by one)
+    filename: png file
+    width: width of the image in pixels (default: width of the first figure),
+           narrower figures are padded with the background and wider ones cropped
+    background: rgb color of the padding
+    compress_level: zlib compression level
+
+    Ouput:
+    -----
+    height: height of the image in pixels
+    failures: list of (figure number, error) of the figures skipped
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    compressor = zlib.compressobj(compress_level)
+    height, failures = 0, []
+    from bokeh.io.webdriver import webdriver_control
+    driver = webdriver_control.create()
+    try:
+        with open(filename, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+            ihdr_pos = f.tell()
+            f.write(png_chunk(b'IHDR', struct.pack('>IIBBBBB', 0, 0, 8, 2, 0, 0, 0)))
+
+            for fig_num, fig in enumerate(figs):
+                try:
+                    if callable(fig): fig = fig()
+                    image = get_screenshot_as_png(fig, driver = driver).convert('RGB')
+                except Exception as error:
+                    failures.append((fig_num, '{}: {}'.format(type(error).__name__, error)))
+                    continue
+
+                # rows of the figure (filter byte then rgb values)
+                if width is None: width = image.width
+                strip = np.empty((image.height, width, 3), dtype = np.uint8)
+                strip[:] = background
+                strip[:, :min(width, image.width)] = np.asarray(image)[:, :width]
+                rows = np.concatenate([np.zeros((image.height, 1), dtype = np.uint8), strip.reshape(image.height, -1)], axis = 1)
+
+                data = compressor.compress(rows.tobytes())
+                if data: f.write(png_chunk(b'IDAT', data))
+                height += image.height
+                del image, strip, rows
+
+            f.write(png_chunk(b'IDAT', compressor.flush()))
+            f.write(png_chunk(b'IEND', b''))
+
+            # header with the final size
+            f.seek(ihdr_pos)
+            f.write(png_chunk(b'IHDR', struct.pack('>IIBBBBB', width or 0, height, 8, 2, 0, 0, 0)))
+    finally:
+        driver.quit()
+
+    # no image of zero height
+    if height == 0:
+        os.remove(filename)
+        raise RuntimeError('no figure rasterized: {}'.format('; '.join(['figure {}: {}'.format(fig_num, error)
+                                                                          for fig_num, error in failures]) or 'no figure given'))
+
+    return height, failures
@@ -0,0 +1,163 @@
+# General imports
+# ---------------
+import numpy as np
+from functools import reduce
+from store_class import column_codes
+
+def build_index(pd, columns):
+    """
+    Goal:
+    -----
+    Build the bitmap index of the closed questions: one packed bit array per answer,
+    bit i being set when the respondent i gave this answer
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    columns: closed question columns to index
+
+    Ouput:
+    -----
+    index: dictionary of the number of respondents (num_rows) and of the bitmaps
+           per column and per answer
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    bitmaps = {}
+    for column in columns:
+        codes, table = column_codes(pd, column)
+
+        # one-hot answers packed along the respondents (answers x bytes)
+        onehot = codes[:,np.newaxis] == np.arange(len(table))
+        bits = np.packbits(onehot, axis = 0).T
+        bitmaps[column] = dict((val, bits[code]) for code, val in enumerate(table) if val is not None)
+
+    num_rows = len(codes) if columns else 0
+
+    return dict(num_rows = num_rows, bitmaps = bitmaps)
+
+
+def answer(index, column, values):
+    """
+    Goal:
+    -----
+    Select the respondents who gave one of the answers to a question
+
+    Input:
+    -----
+    index: bitmap index (see build_index)
+    column: indexed column
+    values: answer or list of answers
+
+    Ouput:
+    -----
+    bits: packed bit array of the selected respondents
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if isinstance(values, str): values = [values]
+    empty = np.zeros((index['num_rows'] + 7)//8, dtype = np.uint8)
+
+    return reduce(np.bitwise_or, [index['bitmaps'][column].get(val, empty) for val in values], empty)
+
+
+def select_and(*bits_list):
+    """
+    Goal:
+    -----
+    Select the respondents matching all the predicates
+
+    Input:
+    -----
+    bits_list: packed bit arrays (see answer)
+
+    Ouput:
+    -----
+    bits: packed bit array of the selected respondents
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    return reduce(np.bitwise_and, bits_list)
+
+
+def select_or(*bits_list):
+    """
+    Goal:
+    -----
+    Select the respondents matching at least one of the predicates
+
+    Input:
+    -----
+    bits_list: packed bit arrays (see answer)
+
+    Ouput:
+    -----
+    bits: packed bit array of the selected respondents
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    return reduce(np.bitwise_or, bits_list)
+
+
+def select_not(index, bits):
+    """
+    Goal:
+    -----
+    Select the respondents not matching a predicate
+
+    Input:
+    -----
+    index: bitmap index (see build_index)
+    bits: packed bit array (see answer)
+
+    Ouput:
+    -----
+    bits: packed bit array of the selected respondents
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    return np.packbits(~np.unpackbits(bits, count = index['num_rows']).astype(bool))
+
+
+def to_mask(index, bits):
+    """
+    Goal:
+    -----
+    Convert the selection to the respondent mask given to the plot functions (mask = ...)
+
+    Input:
+    -----
+    index: bitmap index (see build_index)
+    bits: packed bit array (see answer)
+
+    Ouput:
+    -----
+    mask: boolean array of the selected respondents
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    return np.unpackbits(bits, count = index['num_rows']).astype(bool)
@@ -0,0 +1,108 @@
+# General imports
+# ---------------
+import numpy as np
+from functools import lru_cache
+from bokeh.palettes import brewer
+
+def bar_plot_height(num_bar, val_bar = 40):
+    """
+    Goal:
+    -----
+    Compute the height of a horizontal bar figure from its number of bars, the few
+    bar figures getting some more pixels per bar to leave room for the title, fading
+    with the number of bars (former heights from 2 to 5 bars)
+
+    Input:
+    -----
+    num_bar: number of bars
+    val_bar: height of a bar in pixels
+
+    Ouput:
+    -----
+    plot_height: height of the figure in pixels
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    add_pix = int(round(10/max(num_bar - 1, 1)**1.2))
+
+    return (val_bar + add_pix)*num_bar
+
+
+# light colours left out of the ramps of the notebook figures (colours of sondage.png)
+baseline_skips = dict(  category_plot = {4: 1},
+                        free_question_plot = {8: 1})
+
+@lru_cache(maxsize = None)
+def color_ramp(cmap, num_colors, skip = 2):
+    """
+    Goal:
+    -----
+    Build a colour ramp of any length from a brewer colormap, leaving out the skip
+    lightest colours (as brewer[cmap][num_colors+skip][:num_colors]). When that palette
+    does not exist, the ramp is interpolated along the largest one, still leaving out
+    the light colours. The ramps are cached.
+
+    Input:
+    -----
+    cmap: brewer colormap
+    num_colors: number of colours
+    skip: number of light colours left out
+
+    Ouput:
+    -----
+    color: tuple of hex colours
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if num_colors + skip in brewer[cmap]:
+        return tuple(brewer[cmap][num_colors + skip][:num_colors])
+
+    # interpolate along the largest palette
+    palette = brewer[cmap][max(brewer[cmap])]
+    rgb_mat = np.array([[int(col[pos:pos+2], 16) for pos in (1, 3, 5)] for col in palette], dtype = float)
+    pos_array = np.linspace(0, len(palette) - 1, num_colors + skip)[:num_colors]
+    rgb_ramp = np.array([np.interp(pos_array, np.arange(len(palette)), rgb_mat[:,chan]) for chan in range(3)]).T
+
+    return tuple('#{:02x}{:02x}{:02x}'.format(*rgb) for rgb in np.round(rgb_ramp).astype(int))
+
+
+def bar_colors(cmap, num_bar, skip = 2, plot = None):
+    """
+    Goal:
+    -----
+    Get the colours of the bars of a figure: two contrasted colours for one or two bars,
+    a colour ramp (see color_ramp) otherwise, the ramps of the notebook figures keeping
+    their former colours (see baseline_skips)
+
+    Input:
+    -----
+    cmap: brewer colormap
+    num_bar: number of bars
+    skip: number of light colours left out of the ramp
+    plot: name of the plot function drawing the bars (e.g. 'category_plot')
+
+    Ouput:
+    -----
+    color: array of hex colours
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if num_bar < 3:
+        color = np.array(brewer[cmap][6])[[1,-2]]
+        return color[:num_bar]
+
+    skip = baseline_skips.get(plot, {}).get(num_bar, skip)
+
+    return np.array(color_ramp(cmap, num_bar, skip))
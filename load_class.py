@@ -0,0 +1,106 @@
+# General imports
+# ---------------
+import os
+import time
+import pyarrow as pa
+from pyarrow import csv
+import pyarrow.compute as pc
+from pandas import read_csv, StringDtype
+from tally_class import default_renames, rename_headers
+
+def question_dtypes(data_filename, skiprows = [0,1], rep = 'X', max_values = 32, sample_rows = 10000):
+    """
+    Goal:
+    -----
+    Build the dtype map of the questions from the first rows of the data: 'bool' for the
+    boxes of the grids (only rep or empty), 'category' for the closed questions (at most
+    max_values different answers) and 'string' for the free questions
+
+    Input:
+    -----
+    data_filename: csv file of the poll
+    skiprows: rows to skip before the header (as in pandas read_csv)
+    rep: value of a ticked box
+    max_values: maximum number of different answers of a closed question
+    sample_rows: number of rows read to classify the questions
+
+    Ouput:
+    -----
+    dtypes: dictionary of the dtype ('bool', 'category' or 'string') of each column
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    sample = read_csv(data_filename, skiprows = skiprows, nrows = sample_rows, dtype = str)
+
+    dtypes = {}
+    for column, header in enumerate(sample):
+        answers = sample[header].dropna().unique()
+        if len(answers) and set(answers) <= set([rep]):   dtypes[column] = 'bool'
+        elif len(answers) <= max_values:                  dtypes[column] = 'category'
+        else:                                             dtypes[column] = 'string'
+
+    return dtypes
+
+
+def load_data(data_filename, skiprows = [0,1], renames = default_renames, dtypes = None, rep = 'X', report = True):
+    """
+    Goal:
+    -----
+    Load the data with the multithreaded Arrow csv parser: the closed questions as
+    dictionary-encoded categories, the boxes of the grids as booleans and the free
+    questions as arrow strings, the headers being renamed at parse time
+
+    Input:
+    -----
+    data_filename: csv file of the poll
+    skiprows: rows to skip before the header (as in pandas read_csv)
+    renames: dictionary of the new header of some columns
+    dtypes: dictionary of the dtype ('bool', 'category' or 'string') of each column,
+            default: see question_dtypes
+    rep: value of a ticked box
+    report: if True (default) print the parse time, throughput and memory of the data
+
+    Ouput:
+    -----
+    pd: pandas dataframe
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    start_time = time.time()
+
+    # headers as pandas names them (duplicated headers numbered), then renamed
+    headers = list(read_csv(data_filename, skiprows = skiprows, nrows = 0))
+    headers = rename_headers(headers, renames)
+    if dtypes is None: dtypes = question_dtypes(data_filename, skiprows = skiprows, rep = rep)
+
+    arrow_types = dict(bool = pa.bool_(), category = pa.dictionary(pa.int32(), pa.string()), string = pa.string())
+    column_types = dict((headers[column], arrow_types[dtype]) for column, dtype in dtypes.items())
+
+    table = csv.read_csv(data_filename,
+                         read_options = csv.ReadOptions(skip_rows = len(skiprows) + 1, column_names = headers, use_threads = True),
+                         convert_options = csv.ConvertOptions(column_types = column_types, true_values = [rep], false_values = [],
+                                                              strings_can_be_null = True))
+
+    # empty boxes are not ticked
+    for column, dtype in dtypes.items():
+        if dtype == 'bool':
+            table = table.set_column(column, headers[column], pc.fill_null(table.column(column), False))
+
+    pd = table.to_pandas(types_mapper = {pa.string(): StringDtype('pyarrow')}.get)
+
+    if report:
+        parse_time = time.time() - start_time
+        file_size = os.path.getsize(data_filename)
+        print('{}: {} rows x {} columns in {:1.3f} s ({:1.1f} MB/s, {:1.0f} rows/s), {:1.1f} MB in memory'.format(
+              data_filename, len(pd), pd.shape[1], parse_time, file_size/1e6/parse_time, len(pd)/parse_time,
+              pd.memory_usage(deep = True).sum()/1e6))
+
+    return pd
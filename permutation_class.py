@@ -0,0 +1,207 @@
+# General imports
+# ---------------
+import os
+import numpy as np
+from functools import reduce
+from concurrent.futures import ProcessPoolExecutor
+from scipy.sparse import csr_matrix
+from pandas import DataFrame
+from store_class import column_codes
+from tally_class import column_headers
+from association_class import onehot_matrix
+
+def segment_chi2(count_mat, total_array, starts):
+    """
+    Goal:
+    -----
+    Compute the chi-square of each segment against the other respondents for each
+    question, from the answer counts of the segments
+
+    Input:
+    -----
+    count_mat: answer counts of each segment (... x segments x answers)
+    total_array: answer counts of all the respondents
+    starts: first answer column of each question (and total number of answer columns)
+
+    Ouput:
+    -----
+    chi2_mat: chi-square of each segment and question (... x segments x questions)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    block_starts = starts[:-1]
+    question_of = np.repeat(np.arange(block_starts.size), np.diff(starts))
+
+    # respondents of the segment (num_in) and of the others (num_out) answering each question
+    num_all = np.add.reduceat(total_array, block_starts)
+    num_in = np.add.reduceat(count_mat, block_starts, axis = -1)
+    num_out = num_all - num_in
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        expect_mat = num_in[...,question_of]*total_array/num_all[question_of]
+        terms = np.where(total_array > 0, (count_mat - expect_mat)**2/total_array, 0)
+        chi2_mat = np.add.reduceat(terms, block_starts, axis = -1)*num_all**2/(num_in*num_out)
+
+    return np.nan_to_num(chi2_mat)
+
+
+def permutation_block(onehot_mat, seg_codes, num_seg, starts, chi2_obs, num_perm, seed):
+    """
+    Goal:
+    -----
+    Count, for a block of permutations of the segment labels, how often the chi-square
+    of each segment and question reaches the observed one. The counts of all the
+    permutations of the block come from one sparse matrix product.
+
+    Input:
+    -----
+    onehot_mat: sparse matrix of the answers (see association_class.onehot_matrix)
+    seg_codes: segment of each respondent
+    num_seg: number of segments
+    starts: first answer column of each question (and total number of answer columns)
+    chi2_obs: observed chi-square of each segment and question
+    num_perm: number of permutations of the block
+    seed: seed of the permutations
+
+    Ouput:
+    -----
+    exceed_mat: number of permutations reaching the observed chi-square (segments x questions)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    rng = np.random.default_rng(seed)
+    num_rows = seg_codes.size
+    perm_codes = rng.permuted(np.tile(seg_codes, (num_perm, 1)), axis = 1)
+
+    # one-hot of the permuted labels of all the permutations ((permutations x segments) x respondents)
+    label_mat = csr_matrix((np.ones(num_perm*num_rows), ((np.arange(num_perm)[:,np.newaxis]*num_seg + perm_codes).ravel(),
+                            np.tile(np.arange(num_rows), num_perm))), shape = (num_perm*num_seg, num_rows))
+    count_mat = (label_mat @ onehot_mat).toarray().reshape(num_perm, num_seg, -1)
+    total_array = np.asarray(onehot_mat.sum(axis = 0)).ravel()
+
+    chi2_perm = segment_chi2(count_mat, total_array, starts)
+
+    return (chi2_perm >= chi2_obs - 1e-9).sum(axis = 0)
+
+
+def adjust_pvalues(p_array, method = 'holm'):
+    """
+    Goal:
+    -----
+    Correct p-values for multiple comparisons
+
+    Input:
+    -----
+    p_array: p-values
+    method: 'holm' (default), 'bonferroni', 'fdr_bh' (Benjamini-Hochberg) or None
+
+    Ouput:
+    -----
+    p_adjusted: corrected p-values
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    p_array = np.asarray(p_array, dtype = float)
+    num_test = p_array.size
+    if method is None or num_test == 0:
+        return p_array
+    if method == 'bonferroni':
+        return np.minimum(p_array*num_test, 1)
+
+    order = np.argsort(p_array, kind = 'stable')
+    p_sorted = p_array[order]
+    if method == 'holm':
+        p_sorted = np.maximum.accumulate(p_sorted*(num_test - np.arange(num_test)))
+    elif method == 'fdr_bh':
+        p_sorted = np.minimum.accumulate((p_sorted*num_test/(np.arange(num_test) + 1))[::-1])[::-1]
+    else:
+        raise ValueError('unknown correction: {}'.format(method))
+
+    p_adjusted = np.empty(num_test)
+    p_adjusted[order] = np.minimum(p_sorted, 1)
+
+    return p_adjusted
+
+
+def permutation_tests(pd, segment_column, columns, checkbox_columns = [], num_perm = 9999, block_size = 250,
+                      num_workers = None, correction = 'holm', seed = 0):
+    """
+    Goal:
+    -----
+    Test whether the answers of each segment (e.g. seniority, column 3) differ from the answers
+    of the other respondents, for every closed question, with permutations of the segment
+    labels. The permutations are counted by blocks spread over a pool of processes.
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    segment_column: column of the segments
+    columns: closed question columns
+    checkbox_columns: columns of ticked boxes (see association_class.onehot_matrix)
+    num_perm: number of permutations
+    block_size: number of permutations counted by one matrix product
+    num_workers: number of processes (default: number of cores)
+    correction: multiple comparison correction of the p-values (see adjust_pvalues)
+    seed: seed of the permutations
+
+    Ouput:
+    -----
+    table: pandas dataframe of the segment, question, chi-square, p-value and corrected
+           p-value of each question x segment pair
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if num_workers is None: num_workers = os.cpu_count()
+
+    # respondents with a segment
+    seg_codes, seg_table = column_codes(pd, segment_column)
+    seg_codes = np.asarray(seg_codes, dtype = int)
+    seg_values = [val for val in seg_table if val is not None]
+    keep = np.array([seg_table[code] is not None for code in seg_codes], dtype = bool)
+    seg_codes = np.searchsorted([code for code, val in enumerate(seg_table) if val is not None], seg_codes[keep])
+    num_seg = len(seg_values)
+
+    onehot_mat, starts, levels = onehot_matrix(pd, columns, checkbox_columns = checkbox_columns)
+    onehot_mat = onehot_mat[keep]
+
+    # observed chi-square
+    seg_mat = csr_matrix((np.ones(seg_codes.size), (seg_codes, np.arange(seg_codes.size))), shape = (num_seg, seg_codes.size))
+    total_array = np.asarray(onehot_mat.sum(axis = 0)).ravel()
+    chi2_obs = segment_chi2((seg_mat @ onehot_mat).toarray(), total_array, starts)
+
+    # permutations by blocks
+    block_perms = [min(block_size, num_perm - block_start) for block_start in range(0, num_perm, block_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(block_perms))
+    num_blocks = len(block_perms)
+    with ProcessPoolExecutor(max_workers = num_workers) as executor:
+        exceed_list = list(executor.map(permutation_block, [onehot_mat]*num_blocks, [seg_codes]*num_blocks, [num_seg]*num_blocks,
+                                        [starts]*num_blocks, [chi2_obs]*num_blocks, block_perms, seeds))
+    exceed_mat = reduce(np.add, exceed_list)
+
+    p_mat = (exceed_mat + 1)/(num_perm + 1)
+    headers = np.array(column_headers(pd))[list(columns)]
+    table = DataFrame(dict( segment = np.repeat(seg_values, len(columns)),
+                            question = np.tile(headers, num_seg),
+                            column = np.tile(columns, num_seg),
+                            n = np.repeat(np.bincount(seg_codes, minlength = num_seg), len(columns)),
+                            chi2 = chi2_obs.ravel(),
+                            p_value = p_mat.ravel()))
+    table['p_corrected'] = adjust_pvalues(table['p_value'], method = correction)
+
+    return table
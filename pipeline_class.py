@@ -0,0 +1,134 @@
+# General imports
+# ---------------
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from bokeh.io import export_png
+from export_class import export_tallies
+
+async def report_pipeline(load_data, fig_jobs, text_jobs = [], text_filename = 'others.txt', png_folder = 'png', queue_size = 2, tally_filename = None, backend = 'bokeh'):
+    """
+    Goal:
+    -----
+    Produce the report with overlapped stages: loading, then counting and figure
+    construction, rasterization and text writing running at the same time and joined
+    by a bounded queue, so that figure N+1 is computed while figure N is exported.
+    In a notebook use: filenames, figs = await report_pipeline(...)
+
+    Input:
+    -----
+    load_data: function without argument returning the pandas dataframe
+    fig_jobs: list of (name, plot function, dictionary of arguments without pd),
+              name being a list of names for the functions returning several figures (calendar_plot)
+    text_jobs: list of (save function, dictionary of arguments without pd and f), e.g. (save_free_text, dict(title = ..., column = 20))
+    text_filename: text file of the free answers
+    png_folder: folder of the png files (one per figure)
+    queue_size: maximum number of figures waiting to be exported
+    tally_filename: file name of the tally exports (see export_class.export_tallies), default: no export,
+                    the plot functions of the jobs must then accept results = ...
+    backend: 'bokeh' (default) to export the png files through a browser, 'raster' to draw them
+             without browser (see raster_class.raster_png)
+
+    Ouput:
+    -----
+    filenames: dictionary of the png file of each figure
+    figs: dictionary of the bokeh figures
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    loop = asyncio.get_running_loop()
+    os.makedirs(png_folder, exist_ok = True)
+    compute_pool = ThreadPoolExecutor(max_workers = 1)
+    raster_pool = ThreadPoolExecutor(max_workers = 1)
+    text_pool = ThreadPoolExecutor(max_workers = 1)
+    fig_queue = asyncio.Queue(maxsize = queue_size)
+    filenames, figs = {}, {}
+    tallies = [] if tally_filename is not None else None
+
+    # loading stage
+    pd = await loop.run_in_executor(compute_pool, load_data)
+
+    async def figure_stage():
+        try:
+            for name, plot_func, kwargs in fig_jobs:
+                if tallies is not None: kwargs = dict(kwargs, results = tallies)
+                result = await loop.run_in_executor(compute_pool, functools.partial(plot_func, pd, **kwargs))
+                names = name if isinstance(name, (list, tuple)) else [name]
+                results = result if isinstance(result, tuple) else (result,)
+                for fig_name, fig in zip(names, results):
+                    figs[fig_name] = fig
+                    await fig_queue.put((fig_name, fig))
+        finally:
+            await fig_queue.put(None)
+
+    async def raster_stage():
+        driver = None
+        if backend == 'raster':
+            # matplotlib imported here, so that the bokeh backend runs without it
+            from raster_class import raster_png
+        else:
+            # browser imported here, so that the raster backend runs without selenium
+            from bokeh.io.webdriver import webdriver_control
+            driver = await loop.run_in_executor(raster_pool, webdriver_control.create)
+        try:
+            while True:
+                item = await fig_queue.get()
+                if item is None:
+                    break
+                fig_name, fig = item
+                filename = os.path.join(png_folder, '{}.png'.format(fig_name))
+                if backend == 'raster':
+                    await loop.run_in_executor(raster_pool, functools.partial(raster_png, fig, filename))
+                else:
+                    await loop.run_in_executor(raster_pool, functools.partial(export_png, fig, filename = filename, webdriver = driver))
+                filenames[fig_name] = filename
+        finally:
+            if driver is not None:
+                await loop.run_in_executor(raster_pool, driver.quit)
+
+    def text_stage():
+        with open(text_filename, 'w') as f:
+            for save_func, kwargs in text_jobs:
+                save_func(pd, f = f, **kwargs)
+
+    try:
+        await asyncio.gather(figure_stage(), raster_stage(), loop.run_in_executor(text_pool, text_stage))
+    finally:
+        for pool in [compute_pool, raster_pool, text_pool]:
+            pool.shutdown(wait = False)
+
+    if tallies is not None:
+        export_tallies(tallies, tally_filename)
+
+    return filenames, figs
+
+
+def run_report(load_data, fig_jobs, text_jobs = [], text_filename = 'others.txt', png_folder = 'png', queue_size = 2, tally_filename = None, backend = 'bokeh'):
+    """
+    Goal:
+    -----
+    Run the report pipeline (see report_pipeline) from a script
+
+    Input:
+    -----
+    see report_pipeline
+
+    Ouput:
+    -----
+    filenames: dictionary of the png file of each figure
+    figs: dictionary of the bokeh figures
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    return asyncio.run(report_pipeline(load_data, fig_jobs, text_jobs = text_jobs, text_filename = text_filename,
+                                       png_folder = png_folder, queue_size = queue_size, tally_filename = tally_filename,
+                                       backend = backend))
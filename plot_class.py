@@ -7,8 +7,11 @@ from bokeh.plotting import figure
 from bokeh.models import ColumnDataSource
 from bokeh.palettes import all_palettes,brewer,viridis,mpl
 from bokeh.layouts import gridplot
+from bokeh.transform import linear_cmap
+from layout_class import bar_plot_height, bar_colors
+from tally_class import column_headers, column_values, category_counts, checkbox_counts, checkbox_matrix, likert_counts, grid_counts, likert_summary, record_tally, apply_sample, margin_labels
 
-def category_plot(pd, column, order,cmap, title = 'title', force_list = False, list_array_force = [], show_plot = False):
+def category_plot(pd, column, order,cmap, title = 'title', force_list = False, list_array_force = [], show_plot = False, tally = None, weights = None, mask = None, results = None, sample = None):
     """
     Goal:
     -----
@@ -16,7 +19,7 @@ def category_plot(pd, column, order,cmap, title = 'title', force_list = False, l
     
     Input:
     -----
-    pd: pandas dataframe
+    pd: pandas dataframe (or binary store, see store_class.open_store)
     column: column of the data to analyse
     order: order list of the y axis
     title: title of the figure
@@ -24,6 +27,11 @@ def category_plot(pd, column, order,cmap, title = 'title', force_list = False, l
     force_list: if True put the value of the list
     list_array_force: value of the list
     show_plot: if False (default) do not show the figure
+    tally: tally state (see tally_class.update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+    results: list where the tally of the figure is kept (see tally_class.record_tally), default: not kept
+    sample: random sample of the respondents for a quick look (see tally_class.draw_sample), default: all
     
     Ouput:
     -----
@@ -35,50 +43,34 @@ def category_plot(pd, column, order,cmap, title = 'title', force_list = False, l
     
     """
 
-    header = list(pd)[column]
-    list_array = pd[header].unique()
-    list_array = np.array(list_array)
+    list_array = column_values(pd, column, tally = tally)
     if force_list == True: 
         list_array = np.array(list_array_force)
     
-    sum_cat = []
-
-    for cat_num,cat in enumerate(list_array):
-        sum_cat.append(pd[pd[header]==list_array[cat_num]][header].count())
-
-    sum_array = np.array(sum_cat)
+    weights, mask = apply_sample(sample, weights, mask)
+    sum_array = category_counts(pd, column, list_array, tally = tally, weights = weights, mask = mask)
     ratio_array = sum_array/sum_array.sum()
+    record_tally(results, title, 'category_plot', list_array, sum_array, order = order, columns = [column])
     
     # basic settings
     plot_width = 1000
     num_bar = len(list_array)
     val_bar = 40
-    if num_bar == 2:     add_pix = 10
-    elif num_bar == 3:   add_pix = 4
-    elif num_bar == 4:   add_pix = 3
-    elif num_bar == 5:   add_pix = 2
-    elif num_bar == 6:   add_pix = 0
-    elif num_bar == 7:   add_pix = 0
-    plot_height = (val_bar+add_pix)*num_bar
+    plot_height = bar_plot_height(num_bar, val_bar)
     
     bar_height = 0.8
     x_range = (0, 1.5)
     
     # define text addition to plot
     txt_val = []
-    for ratio,num in zip(ratio_array,sum_array):
-        txt_val.append("  {:1.0f} % (n = {:1.0f})".format(ratio*100,num))
+    txt_margin = margin_labels(ratio_array, sum_array.sum(), sample)
+    for ratio,num,margin in zip(ratio_array,sum_array,txt_margin):
+        txt_val.append("  {:1.0f} %{} (n = {:1.0f})".format(ratio*100,margin,num))
     txt_val = np.array(txt_val)
     
     # define source dictionnary
     num_palette = ratio_array.size
-    if num_palette < 3: 
-        color = np.array(brewer[cmap][6])
-        color = (color[1],color[-2])
-    elif num_palette == 4: 
-        color = np.array(brewer[cmap][num_palette+1])[np.arange(0,num_palette)]
-    else:
-        color = np.array(brewer[cmap][num_palette+2])[np.arange(0,num_palette)]
+    color = bar_colors(cmap, num_palette, plot = 'category_plot')
     
     dict_ds = dict( x_val = ratio_array[order], 
                     y_val = list_array[order],
@@ -108,7 +100,7 @@ def category_plot(pd, column, order,cmap, title = 'title', force_list = False, l
     return fig
 
 
-def calendar_plot(pd, col_start, title, order, cmap, show_plot = False):
+def calendar_plot(pd, col_start, title, order, cmap, show_plot = False, tally = None, weights = None, mask = None, results = None, sample = None):
     """
     Goal:
     -----
@@ -116,12 +108,17 @@ def calendar_plot(pd, col_start, title, order, cmap, show_plot = False):
     
     Input:
     -----
-    pd: pandas dataframe
+    pd: pandas dataframe (or binary store, see store_class.open_store)
     col_start: column where the values of the poll start
     header: title of the figure
     order: order list of the y axis
     cmap: colormap
     show_plot: if false (default) do not show the figure
+    tally: tally state (see tally_class.update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+    results: list where the tally of the figure is kept (see tally_class.record_tally), default: not kept
+    sample: random sample of the respondents for a quick look (see tally_class.draw_sample), default: all
     
     Ouput:
     -----
@@ -142,32 +139,11 @@ def calendar_plot(pd, col_start, title, order, cmap, show_plot = False):
     parts = np.array(['matin','après-midi','soirée'])
     list_select = ['O','X']
 
-    sum_array = []
-    sum_mor_array = []
-    sum_aft_array = []
-    sum_eve_array = []
-    for day in days:
-        if day == days[0]:  columns = [col_start+ 0, col_start+ 1, col_start+ 2]
-        elif day == days[1]:columns = [col_start+ 3, col_start+ 4, col_start+ 5]
-        elif day == days[2]:columns = [col_start+ 6, col_start+ 7, col_start+ 8]
-        elif day == days[3]:columns = [col_start+ 9, col_start+10, col_start+11]
-        elif day == days[4]:columns = [col_start+12, col_start+13, col_start+14]
-        elif day == days[5]:columns = [col_start+15, col_start+16, col_start+17]
-        elif day == days[6]:columns = [col_start+18, col_start+19, col_start+20]
-
-        pd[list(pd)[columns[0]]].fillna(list_select[0])
-        pd[list(pd)[columns[1]]].fillna(list_select[0])
-        pd[list(pd)[columns[2]]].fillna(list_select[0])
-        sum_mor_array.append(pd[pd[list(pd)[columns[0]]]==list_select[1]].count()[list(pd)[columns[0]]])
-        sum_aft_array.append(pd[pd[list(pd)[columns[1]]]==list_select[1]].count()[list(pd)[columns[1]]])
-        sum_eve_array.append(pd[pd[list(pd)[columns[2]]]==list_select[1]].count()[list(pd)[columns[2]]])
-
-        for column in columns:
-            sum_array.append(pd[pd[list(pd)[column]]==list_select[1]].count()[list(pd)[column]])
-
-    sum_mor_array = np.array(sum_mor_array)
-    sum_aft_array = np.array(sum_aft_array)
-    sum_eve_array = np.array(sum_eve_array)
+    weights, mask = apply_sample(sample, weights, mask)
+    sum_mat = grid_counts(pd, col_start, (days.size, parts.size), rep = list_select[1], tally = tally, weights = weights, mask = mask)
+    sum_mor_array = sum_mat[:,0]
+    sum_aft_array = sum_mat[:,1]
+    sum_eve_array = sum_mat[:,2]
 
     # response per day
     sum_days_array = sum_mor_array+sum_aft_array+sum_eve_array
@@ -182,6 +158,11 @@ def calendar_plot(pd, col_start, title, order, cmap, show_plot = False):
     ratio_part_aft_array = sum_aft_array/(sum_mor_array+sum_aft_array+sum_eve_array)
     ratio_part_eve_array = sum_eve_array/(sum_mor_array+sum_aft_array+sum_eve_array)
 
+    calendar_columns = np.arange(col_start, col_start + days.size*parts.size)
+    record_tally(results, title[0], 'calendar_plot', days, sum_days_array, order = order[0], columns = calendar_columns)
+    record_tally(results, title[1], 'calendar_plot', parts, sum_parts_array, order = order[1], columns = calendar_columns)
+    record_tally(results, title[2], 'calendar_plot', days, sum_mat, order = order[2], valences = parts, columns = calendar_columns)
+
     # Draw figure
     # -----------
 
@@ -197,8 +178,9 @@ def calendar_plot(pd, col_start, title, order, cmap, show_plot = False):
     num_bar = len(days)
     plot_height0 = val_bar*num_bar
     txt_days_val = []
-    for ratio,num in zip(ratio_days_array,sum_days_array):
-        txt_days_val.append("  {:1.0f} % (n = {:1.0f})".format(ratio*100,num))
+    txt_margin = margin_labels(ratio_days_array, sum_days_array.sum(), sample)
+    for ratio,num,margin in zip(ratio_days_array,sum_days_array,txt_margin):
+        txt_days_val.append("  {:1.0f} %{} (n = {:1.0f})".format(ratio*100,margin,num))
     txt_days_val = np.array(txt_days_val)
     
     dict_ds0 = dict( x_val = ratio_days_array[order[0]], 
@@ -228,8 +210,9 @@ def calendar_plot(pd, col_start, title, order, cmap, show_plot = False):
     num_bar = len(parts)
     plot_height1 = (val_bar+4)*num_bar
     txt_parts_val = []
-    for ratio,num in zip(ratio_parts_array,sum_parts_array):
-        txt_parts_val.append("  {:1.0f} % (n = {:1.0f})".format(ratio*100,num))
+    txt_margin = margin_labels(ratio_parts_array, sum_parts_array.sum(), sample)
+    for ratio,num,margin in zip(ratio_parts_array,sum_parts_array,txt_margin):
+        txt_parts_val.append("  {:1.0f} %{} (n = {:1.0f})".format(ratio*100,margin,num))
     txt_parts_val = np.array(txt_parts_val)
     
     dict_ds1 = dict( x_val = ratio_parts_array[order[1]], 
@@ -308,7 +291,89 @@ def calendar_plot(pd, col_start, title, order, cmap, show_plot = False):
 
     return fig0, fig1, fig2
 
-def free_question_plot(pd, columns, order, cmap, title = 'title', show_plot = False):
+def time_grid_plot(pd, col_start, axes, title, cmap, plot_axes = (0,1), show_plot = False, tally = None, weights = None, mask = None, results = None):
+    """
+    Goal:
+    -----
+    Plot heat map figure of a time grid of any slot axes (e.g. days x hours, half-days),
+    the axes not drawn are summed
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    col_start: column where the values of the poll start
+    axes: list of the slot axes, each as a list of slot names, the last axis changing fastest in the columns
+          (e.g. [['lundi',...,'dimanche'],['matin','après-midi','soirée']])
+    title: title of the figure
+    cmap: colormap
+    plot_axes: axes drawn in rows and in columns of the heat map
+    show_plot: if False (default) do not show the figure
+    tally: tally state (see tally_class.update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+    results: list where the tally of the figure is kept (see tally_class.record_tally), default: not kept
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    # compute values
+    # --------------
+    list_select = ['O','X']
+    axes = [np.array(axis) for axis in axes]
+    shape = tuple([axis.size for axis in axes])
+    sum_grid = grid_counts(pd, col_start, shape, rep = list_select[1], tally = tally, weights = weights, mask = mask)
+
+    # put the drawn axes first and sum the others
+    other_axes = tuple([axis_num for axis_num in range(len(shape)) if axis_num not in plot_axes])
+    rows, cols = axes[plot_axes[0]], axes[plot_axes[1]]
+    sum_mat = np.transpose(sum_grid, tuple(plot_axes) + other_axes).reshape(rows.size, cols.size, -1).sum(axis = 2)
+    ratio_mat = sum_mat/sum_mat.sum()
+    record_tally(results, title, 'time_grid_plot', ['{} - {}'.format(row, col) for row in rows for col in cols], sum_mat.ravel(),
+                 columns = np.arange(col_start, col_start + np.prod(shape)))
+
+    # Draw figure
+    # -----------
+    val_bar = 40
+    plot_width = 1000
+    plot_height = val_bar*rows.size + 60
+
+    txt_val = np.array(["{:1.0f} %".format(ratio*100) for ratio in ratio_mat.ravel()])
+    dict_ds = dict( x_val = np.tile(cols, rows.size),
+                    y_val = np.repeat(rows, cols.size),
+                    ratio = ratio_mat.ravel(),
+                    txt_val = txt_val)
+
+    source = ColumnDataSource(data = dict_ds)
+    fig = figure(x_range = list(cols), y_range = list(rows[::-1]), plot_width = plot_width,
+                 plot_height = plot_height, title = title, x_axis_location = 'above')
+
+    palette = tuple(brewer[cmap][9][::-1])
+    fig.rect(x = 'x_val', y = 'y_val', width = 1, height = 1, line_color = (255,255,255),
+             fill_color = linear_cmap('ratio', palette, low = 0, high = np.nanmax(ratio_mat)), source = source)
+    fig.text(x = 'x_val', y = 'y_val',text = 'txt_val',text_font_style = 'normal', text_font_size = '9pt',text_align = 'center',text_baseline = 'middle',source = source)
+
+    fig.xaxis.axis_label = '';                          fig.toolbar_location = None;
+    fig.yaxis.axis_label = '';                          fig.grid.grid_line_color = None;
+    fig.axis.minor_tick_in = 0;                         fig.axis.minor_tick_out = 0;
+    fig.axis.major_tick_in = 0;                         fig.axis.major_tick_out = 0;
+    fig.outline_line_alpha = 0;                         fig.background_fill_color = (255,255,255);
+    fig.axis.major_label_text_font_style = 'italic';    fig.axis.major_label_text_font_size = '10pt';
+    fig.axis.axis_line_color = None;                    fig.title.text_font_size = '10pt';
+    fig.x_range.range_padding = 0;                      fig.y_range.range_padding = 0;
+
+    if show_plot:
+        show(fig)
+
+    return fig
+
+def free_question_plot(pd, columns, order, cmap, title = 'title', show_plot = False, tally = None, weights = None, mask = None, results = None, sample = None):
     """
     Goal:
     -----
@@ -316,12 +381,17 @@ def free_question_plot(pd, columns, order, cmap, title = 'title', show_plot = Fa
     
     Input:
     -----
-    pd: pandas dataframe
+    pd: pandas dataframe (or binary store, see store_class.open_store)
     columns: column of the data to analyse
     order: order list of the y axis
     cmap : colormap
     title: title of the figure
     show_plot: if False (default) do not show the figure
+    tally: tally state (see tally_class.update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+    results: list where the tally of the figure is kept (see tally_class.record_tally), default: not kept
+    sample: random sample of the respondents for a quick look (see tally_class.draw_sample), default: all
     
     Ouput:
     -----
@@ -334,48 +404,31 @@ def free_question_plot(pd, columns, order, cmap, title = 'title', show_plot = Fa
     """
     
     list_select = ['O','X']
-    sum_array = []
-    cat_array = []
-    for colunm in columns:
-        pd[list(pd)[colunm]] = pd[list(pd)[colunm]].fillna(list_select[0])
-        sum_array.append(pd[pd[list(pd)[colunm]]==list_select[1]].count()[list(pd)[colunm]])
-        cat_array.append(list(pd)[colunm])
-
-    sum_array = np.array(sum_array)
+    weights, mask = apply_sample(sample, weights, mask)
+    sum_array = checkbox_counts(pd, columns, rep = list_select[1], tally = tally, weights = weights, mask = mask)
     ratio_array =  sum_array/sum_array.sum()
-    cat_array = np.array(cat_array)
+    cat_array = np.array(column_headers(pd, tally = tally))[list(columns)]
+    record_tally(results, title, 'free_question_plot', cat_array, sum_array, order = order, columns = columns)
 
     # basic settings
     plot_width = 1000
     num_bar = len(cat_array)
     val_bar = 40
-    if num_bar == 2:     add_pix = 10
-    elif num_bar == 3:   add_pix = 4
-    elif num_bar == 4:   add_pix = 3
-    elif num_bar == 5:   add_pix = 2
-    elif num_bar == 6:   add_pix = 0
-    elif num_bar == 7:   add_pix = 0
-    elif num_bar == 8:   add_pix = 0
-    plot_height = (val_bar+add_pix)*num_bar
+    plot_height = bar_plot_height(num_bar, val_bar)
 
     bar_height = 0.8
     x_range = (0, 1.5)
 
     # define text addition to plot
     txt_val = []
-    for ratio,num in zip(ratio_array,sum_array):
-        txt_val.append("  {:1.0f} % (n = {:1.0f})".format(ratio*100,num))
+    txt_margin = margin_labels(ratio_array, sum_array.sum(), sample)
+    for ratio,num,margin in zip(ratio_array,sum_array,txt_margin):
+        txt_val.append("  {:1.0f} %{} (n = {:1.0f})".format(ratio*100,margin,num))
     txt_val = np.array(txt_val)
 
     # define source dictionnary
     num_palette = ratio_array.size
-    if num_palette < 3: 
-        color = np.array(brewer[cmap][6])
-        color = (color[1],color[-2])
-    elif num_palette == 8:
-        color = np.array(brewer[cmap][num_palette+1])[np.arange(0,num_palette)]
-    else:
-        color = np.array(brewer[cmap][num_palette+2])[np.arange(0,num_palette)]
+    color = bar_colors(cmap, num_palette, plot = 'free_question_plot')
 
     dict_ds = dict( x_val = ratio_array[order], 
                     y_val = cat_array[order],
@@ -405,7 +458,7 @@ def free_question_plot(pd, columns, order, cmap, title = 'title', show_plot = Fa
     return fig
 
 
-def quality_plot(pd, column, order, cmap, title = 'title', show_plot = False):
+def quality_plot(pd, column, order, cmap, title = 'title', show_plot = False, tally = None, weights = None, mask = None, results = None, sample = None):
 
     """
     Goal:
@@ -414,12 +467,17 @@ def quality_plot(pd, column, order, cmap, title = 'title', show_plot = False):
     
     Input:
     -----
-    pd: pandas dataframe
+    pd: pandas dataframe (or binary store, see store_class.open_store)
     column: starter column
     order: order list of the y axis
     title: title of the figure
     cmap : colormap
     show_plot: if False (default) do not show the figure
+    tally: tally state (see tally_class.update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+    results: list where the tally of the figure is kept (see tally_class.record_tally), default: not kept
+    sample: random sample of the respondents for a quick look (see tally_class.draw_sample), default: all
     
     Ouput:
     -----
@@ -434,29 +492,12 @@ def quality_plot(pd, column, order, cmap, title = 'title', show_plot = False):
     valences = np.array(["très bien","bien","pas terrible","mauvais"])
 
 
-    header_choice = list(pd)[column]
-    header_quality = list(pd)[column+1]
-    header_price = list(pd)[column+2]
-    sum_array_choice = []
-    sum_array_quality = []
-    sum_array_price = []
-    for cat_num,cat in enumerate(valences):
-        sum_array_choice.append(pd[pd[header_choice]==valences[cat_num]][header_choice].count())
-        sum_array_quality.append(pd[pd[header_quality]==valences[cat_num]][header_quality].count())
-        sum_array_price.append(pd[pd[header_price]==valences[cat_num]][header_price].count())
-
-    sum_array_choice = np.array(sum_array_choice)
-    sum_array_quality = np.array(sum_array_quality)
-    sum_array_price = np.array(sum_array_price)
-
-    ratio_array_choice = sum_array_choice/sum_array_choice.sum()
-    ratio_array_quality = sum_array_quality/sum_array_quality.sum()
-    ratio_array_price = sum_array_price/sum_array_price.sum()
-
-    ratio_array_val0 = np.array([ratio_array_choice[0],ratio_array_quality[0],ratio_array_price[0]])
-    ratio_array_val1 = np.array([ratio_array_choice[1],ratio_array_quality[1],ratio_array_price[1]])
-    ratio_array_val2 = np.array([ratio_array_choice[2],ratio_array_quality[2],ratio_array_price[2]])
-    ratio_array_val3 = np.array([ratio_array_choice[3],ratio_array_quality[3],ratio_array_price[3]])
+    weights, mask = apply_sample(sample, weights, mask)
+    sum_mat = likert_counts(pd, np.arange(column, column + categories.size), valences, tally = tally, weights = weights, mask = mask)
+    ratio_mat = sum_mat/sum_mat.sum(axis = 1, keepdims = True)
+    ratio_array_val0, ratio_array_val1, ratio_array_val2, ratio_array_val3 = ratio_mat.T
+    record_tally(results, title, 'quality_plot', categories, sum_mat, order = order, valences = valences,
+                 columns = np.arange(column, column + categories.size))
 
 
     # Draw figure
@@ -490,17 +531,19 @@ def quality_plot(pd, column, order, cmap, title = 'title', show_plot = False):
     txt_val1 = []
     txt_val2 = []
     txt_val3 = []
-    for ratio0,ratio1,ratio2,ratio3 in zip(ratio_array_val0,ratio_array_val1,ratio_array_val2,ratio_array_val3):
-        if ratio0*100 > 1: txt_val0.append("{:1.0f} %".format(ratio0*100))
+    txt_margin0, txt_margin1, txt_margin2, txt_margin3 = margin_labels(ratio_mat, sum_mat.sum(axis = 1, keepdims = True), sample).T
+    for ratio0,ratio1,ratio2,ratio3,margin0,margin1,margin2,margin3 in zip(ratio_array_val0,ratio_array_val1,ratio_array_val2,ratio_array_val3,
+                                                                          txt_margin0,txt_margin1,txt_margin2,txt_margin3):
+        if ratio0*100 > 1: txt_val0.append("{:1.0f} %{}".format(ratio0*100,margin0))
         else: txt_val0.append("")
             
-        if ratio1*100 > 1: txt_val1.append("{:1.0f} %".format(ratio1*100))
+        if ratio1*100 > 1: txt_val1.append("{:1.0f} %{}".format(ratio1*100,margin1))
         else: txt_val1.append("")
             
-        if ratio2*100 > 1: txt_val2.append("{:1.0f} %".format(ratio2*100))
+        if ratio2*100 > 1: txt_val2.append("{:1.0f} %{}".format(ratio2*100,margin2))
         else: txt_val2.append("")
             
-        if ratio3*100 > 1: txt_val3.append("{:1.0f} %".format(ratio3*100))
+        if ratio3*100 > 1: txt_val3.append("{:1.0f} %{}".format(ratio3*100,margin3))
         else: txt_val3.append("")
         
 
@@ -537,7 +580,7 @@ def quality_plot(pd, column, order, cmap, title = 'title', show_plot = False):
         
     return fig
 
-def quality_plot2(pd, column, order, cmap, title = 'title', show_plot = False):
+def quality_plot2(pd, column, order, cmap, title = 'title', show_plot = False, tally = None, weights = None, mask = None, results = None, sample = None):
 
     """
     Goal:
@@ -546,12 +589,17 @@ def quality_plot2(pd, column, order, cmap, title = 'title', show_plot = False):
     
     Input:
     -----
-    pd: pandas dataframe
+    pd: pandas dataframe (or binary store, see store_class.open_store)
     column: starter column
     order: order list of the y axis
     title: title of the figure
     cmap : colormap
     show_plot: if False (default) do not show the figure
+    tally: tally state (see tally_class.update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+    results: list where the tally of the figure is kept (see tally_class.record_tally), default: not kept
+    sample: random sample of the respondents for a quick look (see tally_class.draw_sample), default: all
     
     Ouput:
     -----
@@ -570,32 +618,12 @@ def quality_plot2(pd, column, order, cmap, title = 'title', show_plot = False):
     
     valences = np.array(["très bien","bien","pas terrible","mauvais"])
 
-    header0, header1, header2, header3 = list(pd)[column],   list(pd)[column+1], list(pd)[column+2], list(pd)[column+3]
-    header4, header5, header6, header7 = list(pd)[column+4], list(pd)[column+5], list(pd)[column+6], list(pd)[column+7]
-   
-    sum_array0, sum_array1, sum_array2, sum_array3 = [], [], [], []
-    sum_array4, sum_array5, sum_array6, sum_array7 = [], [], [], []
-
-    for cat_num,cat in enumerate(valences):
-        sum_array0.append(pd[pd[header0]==valences[cat_num]][header0].count())
-        sum_array1.append(pd[pd[header1]==valences[cat_num]][header1].count())
-        sum_array2.append(pd[pd[header2]==valences[cat_num]][header2].count())
-        sum_array3.append(pd[pd[header3]==valences[cat_num]][header3].count())
-        sum_array4.append(pd[pd[header4]==valences[cat_num]][header4].count())
-        sum_array5.append(pd[pd[header5]==valences[cat_num]][header5].count())
-        sum_array6.append(pd[pd[header6]==valences[cat_num]][header6].count())
-        sum_array7.append(pd[pd[header7]==valences[cat_num]][header7].count())
-        
-    sum_array0, sum_array1, sum_array2, sum_array3 = np.array(sum_array0), np.array(sum_array0), np.array(sum_array2), np.array(sum_array3),
-    sum_array4, sum_array5, sum_array6, sum_array7 = np.array(sum_array4), np.array(sum_array5), np.array(sum_array6), np.array(sum_array7),
-    
-    ratio_array0, ratio_array1, ratio_array2, ratio_array3 = sum_array0/sum_array0.sum(), sum_array1/sum_array1.sum(), sum_array2/sum_array2.sum(), sum_array3/sum_array3.sum()
-    ratio_array4, ratio_array5, ratio_array6, ratio_array7 = sum_array4/sum_array4.sum(), sum_array5/sum_array5.sum(), sum_array6/sum_array6.sum(), sum_array7/sum_array7.sum()
-
-    ratio_array_val0 = np.array([ratio_array0[0],ratio_array1[0],ratio_array2[0],ratio_array3[0],ratio_array4[0],ratio_array5[0],ratio_array6[0],ratio_array7[0]])
-    ratio_array_val1 = np.array([ratio_array0[1],ratio_array1[1],ratio_array2[1],ratio_array3[1],ratio_array4[1],ratio_array5[1],ratio_array6[1],ratio_array7[1]])
-    ratio_array_val2 = np.array([ratio_array0[2],ratio_array1[2],ratio_array2[2],ratio_array3[2],ratio_array4[2],ratio_array5[2],ratio_array6[2],ratio_array7[2]])
-    ratio_array_val3 = np.array([ratio_array0[3],ratio_array1[3],ratio_array2[3],ratio_array3[3],ratio_array4[3],ratio_array5[3],ratio_array6[3],ratio_array7[3]])
+    weights, mask = apply_sample(sample, weights, mask)
+    sum_mat = likert_counts(pd, np.arange(column, column + categories.size), valences, tally = tally, weights = weights, mask = mask)
+    ratio_mat = sum_mat/sum_mat.sum(axis = 1, keepdims = True)
+    ratio_array_val0, ratio_array_val1, ratio_array_val2, ratio_array_val3 = ratio_mat.T
+    record_tally(results, title, 'quality_plot2', categories, sum_mat, order = order, valences = valences,
+                 columns = np.arange(column, column + categories.size))
 
     # Draw figure
     # -----------
@@ -627,17 +655,19 @@ def quality_plot2(pd, column, order, cmap, title = 'title', show_plot = False):
     txt_val1 = []
     txt_val2 = []
     txt_val3 = []
-    for ratio0,ratio1,ratio2,ratio3 in zip(ratio_array_val0,ratio_array_val1,ratio_array_val2,ratio_array_val3):
-        if ratio0*100 > 1: txt_val0.append("{:1.0f} %".format(ratio0*100))
+    txt_margin0, txt_margin1, txt_margin2, txt_margin3 = margin_labels(ratio_mat, sum_mat.sum(axis = 1, keepdims = True), sample).T
+    for ratio0,ratio1,ratio2,ratio3,margin0,margin1,margin2,margin3 in zip(ratio_array_val0,ratio_array_val1,ratio_array_val2,ratio_array_val3,
+                                                                          txt_margin0,txt_margin1,txt_margin2,txt_margin3):
+        if ratio0*100 > 1: txt_val0.append("{:1.0f} %{}".format(ratio0*100,margin0))
         else: txt_val0.append("")
             
-        if ratio1*100 > 1: txt_val1.append("{:1.0f} %".format(ratio1*100))
+        if ratio1*100 > 1: txt_val1.append("{:1.0f} %{}".format(ratio1*100,margin1))
         else: txt_val1.append("")
             
-        if ratio2*100 > 1: txt_val2.append("{:1.0f} %".format(ratio2*100))
+        if ratio2*100 > 1: txt_val2.append("{:1.0f} %{}".format(ratio2*100,margin2))
         else: txt_val2.append("")
             
-        if ratio3*100 > 1: txt_val3.append("{:1.0f} %".format(ratio3*100))
+        if ratio3*100 > 1: txt_val3.append("{:1.0f} %{}".format(ratio3*100,margin3))
         else: txt_val3.append("")
         
 
@@ -675,6 +705,93 @@ def quality_plot2(pd, column, order, cmap, title = 'title', show_plot = False):
     return fig
 
 
+def likert_summary_plot(pd, columns, cmap, names = None, title = 'title', scores = [4,3,2,1], show_plot = False, tally = None, weights = None, mask = None, results = None):
+
+    """
+    Goal:
+    -----
+    Plot figure of the Likert items ranked by mean score, with the interval of the
+    mean, the top-2-box share and the net satisfaction index (see tally_class.likert_summary)
+    
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    columns: columns of the items
+    cmap : colormap
+    names: names of the items, all different (default: block title and question, see tally_class.item_names)
+    title: title of the figure
+    scores: score of each valence (très bien, bien, pas terrible, mauvais)
+    show_plot: if False (default) do not show the figure
+    tally: tally state (see tally_class.update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+    results: list where the tally of the figure is kept (see tally_class.record_tally), default: not kept
+    
+    Ouput:
+    -----
+    fig: bokeh figure
+    table: pandas dataframe of the indexes per item
+    
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+    
+    """
+
+    columns = list(columns)
+    valences = np.array(["très bien","bien","pas terrible","mauvais"])
+    sum_mat = likert_counts(pd, columns, valences, tally = tally, weights = weights, mask = mask)
+    table = likert_summary(pd, columns, names = names, valences = valences, scores = scores, tally = tally, sum_mat = sum_mat)
+    record_tally(results, title, 'likert_summary_plot', table['item'], sum_mat[[columns.index(column) for column in table['column']]],
+                 valences = valences, columns = table['column'])
+
+    # best item on top
+    table_plot = table.iloc[::-1]
+    cat_array = np.array(table_plot['item'])
+
+    # Draw figure
+    # -----------
+    # general settings
+    val_bar = 30
+    plot_width = 1000
+    bar_height = 0.6
+    score_min, score_max = min(scores), max(scores)
+    x_range = (score_min, score_min + (score_max - score_min)*1.8)
+    plot_height = val_bar*cat_array.size + 40
+
+    txt_val = np.array(["  {:1.2f} | top-2 {:1.0f} % | net {:+1.0f} (n = {:1.0f})".format(mean, top*100, net*100, num)
+                        for mean, top, net, num in zip(table_plot['mean'], table_plot['top2'], table_plot['net'], table_plot['n'])])
+    dict_ds = dict( x_val = np.array(table_plot['mean']),
+                    x_low = np.array(table_plot['mean_low']),
+                    x_high = np.array(table_plot['mean_high']),
+                    y_val = cat_array,
+                    txt_val = txt_val)
+
+    source = ColumnDataSource(data = dict_ds)
+    fig = figure(x_range = x_range, y_range = list(cat_array), plot_width = plot_width,
+                 plot_height = plot_height, title = title)
+
+    color = np.array(brewer[cmap][6])[-2]
+    fig.hbar(y = 'y_val', left = score_min, right = 'x_val', height = bar_height, color = color, source = source)
+    fig.segment(x0 = 'x_low', y0 = 'y_val', x1 = 'x_high', y1 = 'y_val', line_color = 'black', line_width = 1, source = source)
+    fig.text(x = 'x_high', y = 'y_val',text = 'txt_val',text_font_style = 'normal', text_font_size = '10pt',text_align = 'left',text_baseline = 'middle',source = source)
+
+    fig.xaxis.axis_label = '';                          fig.toolbar_location = None;
+    fig.yaxis.axis_label = '';                          fig.grid.grid_line_color = None;
+    fig.axis.minor_tick_in = 0;                         fig.axis.minor_tick_out = 0;
+    fig.axis.major_tick_in = 0;                         fig.axis.major_tick_out = 0;
+    fig.outline_line_alpha = 0;                         fig.background_fill_color = (255,255,255);
+    fig.axis.major_label_text_font_style = 'italic';    fig.yaxis.major_label_text_font_size = '10pt';
+    fig.outline_line_alpha = 0;                         fig.xaxis.major_label_text_font_size = '0pt';
+    fig.axis.axis_line_color = None;                    fig.title.text_font_size = '10pt';
+    fig.y_range.range_padding = 0;
+
+    if show_plot == True:
+        show(fig)
+
+    return fig, table
+
+
 def save_free_text(pd,f,title,column):
     f.write('\n\n--------------------------------------------------------------------------------------------------------------------------------------\n')
     f.write(str(title))
@@ -688,5 +805,5 @@ def save_volunters(pd,f,columns,column_mail,rep):
         f.write('\n\n--------------------------------------------------------------------------------------------------------------------------------------\n')
         f.write(str(list(pd)[column]))
         f.write('\n--------------------------------------------------------------------------------------------------------------------------------------\n')
-        for line in (pd[pd[list(pd)[column]]==rep][list(pd)[column_mail]]):
+        for line in (pd[checkbox_matrix(pd, [column], rep = rep)[:,0]][list(pd)[column_mail]]):
             f.write(str('\n'+str(line)))
\ No newline at end of file
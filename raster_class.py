@@ -0,0 +1,351 @@
+# General imports
+# ---------------
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.patches import Rectangle
+import matplotlib.image as mpimg
+from bokeh.models import HBar, VBar, Rect, Text, Segment, Circle, Scatter, Range1d, FactorRange, Stack, LinearColorMapper
+
+def font_points(font_size):
+    """
+    Goal:
+    -----
+    Convert a bokeh font size ('10pt', '13px') to points
+
+    Input:
+    -----
+    font_size: bokeh font size
+
+    Ouput:
+    -----
+    size: font size in points
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    font_size = str(font_size)
+    if font_size.endswith('px'):
+        return float(font_size[:-2])*0.75
+
+    return float(font_size.rstrip('pt') or 0)
+
+
+def spec_values(glyph, name, data, num):
+    """
+    Goal:
+    -----
+    Get the values of a glyph property for each item of its data: field, fixed value,
+    stack of fields (hbar_stack) or color mapped field (linear_cmap)
+
+    Input:
+    -----
+    glyph: bokeh glyph
+    name: property of the glyph (e.g. 'right', 'fill_color')
+    data: data of the glyph renderer source
+    num: number of items
+
+    Ouput:
+    -----
+    values: array of the values
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    spec = getattr(glyph, name)
+    if isinstance(spec, dict):
+        if 'expr' in spec and isinstance(spec['expr'], Stack):
+            return np.sum([np.asarray(data[field], dtype = float) for field in spec['expr'].fields], axis = 0) if spec['expr'].fields else np.zeros(num)
+        if 'transform' in spec and isinstance(spec['transform'], LinearColorMapper):
+            mapper = spec['transform']
+            palette = list(mapper.palette)
+            values = np.asarray(data[spec['field']], dtype = float)
+            if mapper.high > mapper.low:
+                pos = np.clip((values - mapper.low)/(mapper.high - mapper.low)*len(palette), 0, len(palette) - 1).astype(int)
+            else:
+                # flat map (e.g. no answer under a mask): first colour
+                pos = np.zeros(values.size, dtype = int)
+            return np.array(palette, dtype = object)[pos]
+        if 'field' in spec:
+            return np.asarray(data[spec['field']])
+        spec = spec.get('value')
+    elif isinstance(spec, str) and spec in data:
+        return np.asarray(data[spec])
+
+    # one item per value, an rgb tuple staying one color
+    values = np.empty(num, dtype = object)
+    values.fill(spec)
+
+    return values
+
+
+def axis_coords(values, factor_map):
+    """
+    Goal:
+    -----
+    Convert the values of an axis to plot coordinates, the categorical factor i
+    being centered on i + 0.5 as in bokeh
+
+    Input:
+    -----
+    values: array of the values
+    factor_map: dictionary of the position of each factor (None for a numerical axis)
+
+    Ouput:
+    -----
+    coords: array of the coordinates
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if factor_map is None:
+        return np.asarray(values, dtype = float)
+
+    return np.array([factor_map.get(tuple(val) if isinstance(val, (list, np.ndarray)) else val, np.nan) for val in values], dtype = float)
+
+
+def color_value(color):
+    """
+    Goal:
+    -----
+    Convert a bokeh color (name, hex or rgb tuple) to a matplotlib color
+
+    Input:
+    -----
+    color: bokeh color
+
+    Ouput:
+    -----
+    color: matplotlib color (None for no color)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if color is None:
+        return 'none'
+    if isinstance(color, (tuple, list, np.ndarray)):
+        return tuple(np.array(color[:3], dtype = float)/255) + tuple(float(alpha) for alpha in color[3:])
+
+    return color
+
+
+def text_pixels(mpl_fig, labels, font_size, **kwargs):
+    """
+    Goal:
+    -----
+    Measure the largest width of some labels once drawn
+
+    Input:
+    -----
+    mpl_fig: matplotlib figure
+    labels: list of the labels
+    font_size: font size in points
+    kwargs: other text properties (e.g. fontstyle)
+
+    Ouput:
+    -----
+    width: largest width of the labels in pixels
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    renderer = mpl_fig.canvas.get_renderer()
+    width = 0
+    for label in labels:
+        text = mpl_fig.text(0, 0, label, fontsize = font_size, **kwargs)
+        width = max(width, text.get_window_extent(renderer = renderer).width)
+        text.remove()
+
+    return width
+
+
+def raster_figure(fig, dpi = 100):
+    """
+    Goal:
+    -----
+    Draw a bokeh figure of the plot functions to an rgb image without browser: the
+    bars, stacked bars, heat map cells, segments, dots, texts, legend and labels of
+    its glyphs are redrawn with matplotlib in the bokeh style of the report
+
+    Input:
+    -----
+    fig: bokeh figure
+    dpi: resolution of the drawing (pixels per inch)
+
+    Ouput:
+    -----
+    image: uint8 array of the image (height x width x 3)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    width, height = fig.plot_width, fig.plot_height
+    mpl_fig = Figure(figsize = (width/dpi, height/dpi), dpi = dpi, facecolor = 'white')
+    canvas = FigureCanvasAgg(mpl_fig)
+
+    # categorical axes
+    x_map = dict((factor if not isinstance(factor, list) else tuple(factor), num + 0.5) for num, factor in enumerate(fig.x_range.factors)) if isinstance(fig.x_range, FactorRange) else None
+    y_map = dict((factor if not isinstance(factor, list) else tuple(factor), num + 0.5) for num, factor in enumerate(fig.y_range.factors)) if isinstance(fig.y_range, FactorRange) else None
+
+    # room of the y labels and of the title
+    y_font = font_points(fig.yaxis[0].major_label_text_font_size)
+    x_font = font_points(fig.xaxis[0].major_label_text_font_size)
+    y_labels = [' '.join(factor) if isinstance(factor, (list, tuple)) else str(factor) for factor in (y_map or {})]
+    left_pix = 10 + (text_pixels(mpl_fig, y_labels, y_font, fontstyle = 'italic') if y_labels and y_font else 30)
+    top_pix = 30 if fig.title.text else 10
+    bottom_pix = 10 + (x_font*1.5*dpi/72 if x_font else 0)
+    ax = mpl_fig.add_axes([left_pix/width, bottom_pix/height, max(1 - (left_pix + 10)/width, 0.1), max(1 - (top_pix + bottom_pix)/height, 0.1)])
+
+    legend_items = []
+    for renderer in fig.renderers:
+        glyph, data = renderer.glyph, renderer.data_source.data
+        num = len(next(iter(data.values()))) if data else 0
+        if num == 0:
+            continue
+        get = lambda name: spec_values(glyph, name, data, num)
+
+        if isinstance(glyph, (HBar, VBar, Rect)):
+            if isinstance(glyph, HBar):
+                y_mid, size = axis_coords(get('y'), y_map), get('height').astype(float)
+                x0, x1 = get('left').astype(float), get('right').astype(float)
+                y0, y1 = y_mid - size/2, y_mid + size/2
+            elif isinstance(glyph, VBar):
+                x_mid, size = axis_coords(get('x'), x_map), get('width').astype(float)
+                y0, y1 = get('bottom').astype(float), get('top').astype(float)
+                x0, x1 = x_mid - size/2, x_mid + size/2
+            else:
+                x_mid, y_mid = axis_coords(get('x'), x_map), axis_coords(get('y'), y_map)
+                x_size, y_size = get('width').astype(float), get('height').astype(float)
+                x0, x1, y0, y1 = x_mid - x_size/2, x_mid + x_size/2, y_mid - y_size/2, y_mid + y_size/2
+            fill_colors, line_colors = get('fill_color'), get('line_color')
+            for item in range(num):
+                if not np.isfinite([x0[item], x1[item], y0[item], y1[item]]).all():
+                    continue
+                ax.add_patch(Rectangle((x0[item], y0[item]), x1[item] - x0[item], y1[item] - y0[item],
+                                       facecolor = color_value(fill_colors[item]), edgecolor = color_value(line_colors[item]), linewidth = 0.5))
+
+        elif isinstance(glyph, Segment):
+            x0, x1 = axis_coords(get('x0'), x_map), axis_coords(get('x1'), x_map)
+            y0, y1 = axis_coords(get('y0'), y_map), axis_coords(get('y1'), y_map)
+            colors = get('line_color')
+            for item in range(num):
+                ax.plot([x0[item], x1[item]], [y0[item], y1[item]], color = color_value(colors[item]), linewidth = glyph.line_width)
+
+        elif isinstance(glyph, (Circle, Scatter)):
+            ax.scatter(axis_coords(get('x'), x_map), axis_coords(get('y'), y_map), s = float(get('size')[0])**2*0.5,
+                       c = [color_value(color) for color in get('fill_color')], zorder = 3)
+
+        elif isinstance(glyph, Text):
+            x_txt, y_txt, texts = axis_coords(get('x'), x_map), axis_coords(get('y'), y_map), get('text')
+            align = dict(left = 'left', center = 'center', right = 'right')[get('text_align')[0]]
+            baseline = dict(middle = 'center', top = 'top', bottom = 'bottom', alphabetic = 'baseline')[get('text_baseline')[0]]
+            font_style = get('text_font_style')[0]
+            font_size = font_points(get('text_font_size')[0])
+            for item in range(num):
+                if np.isfinite([x_txt[item], y_txt[item]]).all() and str(texts[item]):
+                    ax.text(x_txt[item], y_txt[item], str(texts[item]), ha = align, va = baseline, fontsize = font_size,
+                            fontstyle = 'italic' if font_style == 'italic' else 'normal', clip_on = True)
+
+    # legend
+    for legend in fig.legend:
+        for item in legend.items:
+            glyph = item.renderers[0].glyph if item.renderers else None
+            color = getattr(glyph, 'fill_color', None) if glyph is not None else None
+            if isinstance(color, dict): color = color.get('value')
+            legend_items.append((Rectangle((0, 0), 1, 1, facecolor = color_value(color)), item.label.get('value') if isinstance(item.label, dict) else str(item.label)))
+    if legend_items:
+        ax.legend([handle for handle, label in legend_items], [label for handle, label in legend_items], loc = 'upper right',
+                  fontsize = 8, frameon = False)
+
+    # ranges
+    if x_map is not None: ax.set_xlim(0, len(x_map))
+    elif isinstance(fig.x_range, Range1d): ax.set_xlim(fig.x_range.start, fig.x_range.end)
+    else: ax.autoscale(axis = 'x')
+    if y_map is not None: ax.set_ylim(0, len(y_map))
+    elif isinstance(fig.y_range, Range1d): ax.set_ylim(fig.y_range.start, fig.y_range.end)
+    else: ax.autoscale(axis = 'y')
+
+    # labels in the style of the report (italic tick labels, no ticks, no axis lines)
+    if y_map is not None:
+        ax.set_yticks(list(y_map.values()))
+        ax.set_yticklabels(y_labels)
+    if x_map is not None:
+        ax.set_xticks(list(x_map.values()))
+        ax.set_xticklabels([' '.join(factor) if isinstance(factor, tuple) else str(factor) for factor in x_map],
+                           rotation = 90 if fig.xaxis[0].major_label_orientation not in ['horizontal', 0] else 0)
+    ax.tick_params(length = 0, labelsize = y_font or 1, labelleft = bool(y_font))
+    ax.tick_params(axis = 'x', labelsize = x_font or 1, labelbottom = bool(x_font))
+    for label in ax.get_xticklabels() + ax.get_yticklabels():
+        label.set_fontstyle('italic')
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    if fig.title.text:
+        mpl_fig.text(5/width, 1 - 8/height, fig.title.text, ha = 'left', va = 'top', fontsize = font_points(fig.title.text_font_size))
+
+    canvas.draw()
+    image = np.asarray(canvas.buffer_rgba())[:, :, :3].copy()
+
+    return image
+
+
+def raster_png(fig, filename, dpi = 100):
+    """
+    Goal:
+    -----
+    Save a bokeh figure, or a grid of figures (list of rows of figures as for gridplot),
+    as a png file without browser (see raster_figure)
+
+    Input:
+    -----
+    fig: bokeh figure, or list of lists of bokeh figures (None for an empty cell)
+    filename: png file
+    dpi: resolution of the drawing (pixels per inch)
+
+    Ouput:
+    -----
+    filename: png file
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if not isinstance(fig, (list, tuple)):
+        mpimg.imsave(filename, raster_figure(fig, dpi = dpi))
+        return filename
+
+    # grid layout: rows of figures side by side
+    row_images = []
+    for row in fig:
+        images = [raster_figure(cell, dpi = dpi) for cell in row if cell is not None]
+        if not images:
+            continue
+        row_height = max([image.shape[0] for image in images])
+        row_images.append(np.concatenate([np.pad(image, ((0, row_height - image.shape[0]), (0, 0), (0, 0)), constant_values = 255)
+                                          for image in images], axis = 1))
+
+    grid_width = max([image.shape[1] for image in row_images])
+    grid_image = np.concatenate([np.pad(image, ((0, 0), (0, grid_width - image.shape[1]), (0, 0)), constant_values = 255)
+                                 for image in row_images], axis = 0)
+    mpimg.imsave(filename, grid_image)
+
+    return filename
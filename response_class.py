@@ -0,0 +1,166 @@
+# General imports
+# ---------------
+import numpy as np
+from bokeh.io import show
+from bokeh.plotting import figure
+from bokeh.models import ColumnDataSource
+from bokeh.palettes import brewer
+from tally_class import record_tally
+
+def response_bits(pd, columns = None, mask = None):
+    """
+    Goal:
+    -----
+    Get the answered cells of the data in one isna pass, packed along the questions
+    (bit j of the row i being set when the respondent i answered the question j)
+
+    Input:
+    -----
+    pd: pandas dataframe
+    columns: columns of the questionnaire, default: all
+    mask: boolean array of the respondents to keep (see filter_class), default: all
+
+    Ouput:
+    -----
+    bits: packed answered cells (respondents x bytes of 8 questions)
+    num_question: number of questions
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if columns is not None:
+        pd = pd.iloc[:, list(columns)]
+    answered = ~pd.isna().to_numpy()
+    if mask is not None:
+        answered = answered[mask]
+
+    return np.packbits(answered, axis = 1), answered.shape[1]
+
+
+def response_funnel(pd, columns = None, mask = None):
+    """
+    Goal:
+    -----
+    Compute the nonresponse of the questionnaire on the packed answered cells (see response_bits):
+    response rate per question, last question answered per respondent and drop-off curve
+    (share of the respondents still answering at each question). The multiple choice
+    questions have empty cells for the boxes not ticked, which lowers their response rate.
+
+    Input:
+    -----
+    pd: pandas dataframe
+    columns: columns of the questionnaire, default: all
+    mask: boolean array of the respondents to keep (see filter_class), default: all
+
+    Ouput:
+    -----
+    funnel: dictionary of the response rate per question (rate), the last question
+            answered per respondent (last, -1 if none), the number of respondents reaching
+            each question (reached) and the number of respondents (num_rows)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    bits, num_question = response_bits(pd, columns = columns, mask = mask)
+    num_rows, num_bytes = bits.shape
+
+    # answered questions per bit position of the bytes (bit 7 being the first question)
+    num_answered = np.zeros(num_bytes*8, dtype = int)
+    for bit_num in range(8):
+        num_answered[bit_num::8] = ((bits >> (7 - bit_num)) & 1).sum(axis = 0)
+    rate = num_answered[:num_question]/max(num_rows, 1)
+
+    # last answered question: last non empty byte and last set bit of this byte
+    last_bit = np.array([7 - ((val & -val).bit_length() - 1) if val else -1 for val in range(256)])
+    non_empty = bits != 0
+    last_byte = num_bytes - 1 - np.argmax(non_empty[:, ::-1], axis = 1)
+    last = np.where(non_empty.any(axis = 1), last_byte*8 + last_bit[bits[np.arange(num_rows), last_byte]], -1)
+
+    # respondents reaching each question
+    last_count = np.bincount(last[last >= 0], minlength = num_question)
+    reached = last_count[::-1].cumsum()[::-1]
+
+    return dict(rate = rate, last = last, reached = reached, num_rows = num_rows)
+
+
+def funnel_plot(pd, cmap, columns = None, names = None, title = 'title', show_plot = False, mask = None, results = None, funnel = None):
+    """
+    Goal:
+    -----
+    Plot figure of the completion funnel of the questionnaire: share of the respondents
+    still answering at each question (bars) and response rate of each question (dots),
+    to be drawn with the other figures of the report (e.g. as a job of pipeline_class.run_report)
+
+    Input:
+    -----
+    pd: pandas dataframe
+    cmap: colormap
+    columns: columns of the questionnaire, default: all
+    names: names of the questions for the x axis, default: question numbers
+    title: title of the figure
+    show_plot: if False (default) do not show the figure
+    mask: boolean array of the respondents to keep (see filter_class), default: all
+    results: list where the tally of the figure is kept (see tally_class.record_tally), default: not kept
+    funnel: completion funnel already computed (see response_funnel), default: computed from pd
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if funnel is None: funnel = response_funnel(pd, columns = columns, mask = mask)
+
+    num_question = funnel['rate'].size
+    num_rows = max(funnel['num_rows'], 1)
+    if names is None: names = np.arange(num_question) + 1
+    names = np.array([str(name) for name in names])
+
+    # tallies of the drop-off curve and of the response rates
+    reached_mat = np.stack([funnel['reached'], funnel['num_rows'] - funnel['reached']], axis = 1)
+    answered = np.round(funnel['rate']*funnel['num_rows'])
+    record_tally(results, title, 'funnel_plot', names, reached_mat, valences = ["répondants restants", "abandons"], columns = columns)
+    record_tally(results, title, 'funnel_plot', names, np.stack([answered, funnel['num_rows'] - answered], axis = 1),
+                 valences = ["réponses", "non réponses"], columns = columns)
+
+    # basic settings
+    plot_width = max(1000, 12*num_question)
+    plot_height = 400
+    bar_width = 0.8
+
+    dict_ds = dict( x_val = names,
+                    reached = funnel['reached']/num_rows,
+                    rate = funnel['rate'])
+
+    source = ColumnDataSource(data = dict_ds)
+    fig = figure(x_range = list(names), y_range = (0, 1.05), plot_width = plot_width,
+                 plot_height = plot_height, title = title)
+
+    color = np.array(brewer[cmap][6])[[1,-2]]
+    fig.vbar(x = 'x_val', top = 'reached', width = bar_width, color = color[1], legend_label = "répondants restants", source = source)
+    fig.circle(x = 'x_val', y = 'rate', size = 5, color = color[0], legend_label = "taux de réponse", source = source)
+
+    fig.xaxis.axis_label = '';                          fig.toolbar_location = None;
+    fig.yaxis.axis_label = '';                          fig.grid.grid_line_color = None;
+    fig.axis.minor_tick_in = 0;                         fig.axis.minor_tick_out = 0;
+    fig.axis.major_tick_in = 0;                         fig.axis.major_tick_out = 0;
+    fig.outline_line_alpha = 0;                         fig.background_fill_color = (255,255,255);
+    fig.axis.major_label_text_font_style = 'italic';    fig.axis.major_label_text_font_size = '7pt';
+    fig.axis.axis_line_color = None;                    fig.title.text_font_size = '10pt';
+    fig.xaxis.major_label_orientation = np.pi/2;        fig.legend.location = 'bottom_left';
+    fig.legend.label_text_font_size = '8pt';            fig.legend.border_line_alpha = 0;
+
+    if show_plot:
+        show(fig)
+
+    return fig
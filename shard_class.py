@@ -0,0 +1,186 @@
+# General imports
+# ---------------
+import io
+import os
+from functools import reduce
+from concurrent.futures import ProcessPoolExecutor
+from pandas import read_csv
+from pandas.errors import ParserError
+from tally_class import count_columns, merge_counts, default_renames, rename_headers
+
+def row_end(f, pos, quoted = False, block_size = 2**20):
+    """
+    Goal:
+    -----
+    Find the end of the row going on at a byte offset of the data file: the next line
+    break outside of a quoted answer (answers can contain line breaks)
+
+    Input:
+    -----
+    f: data file opened in binary mode
+    pos: byte offset
+    quoted: True if the offset is inside a quoted answer
+    block_size: number of bytes read at once
+
+    Ouput:
+    -----
+    pos: byte offset following the line break (end of file if none)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    f.seek(pos)
+    while True:
+        data = f.read(block_size)
+        if not data:
+            return pos
+
+        # quotes (doubled inside answers) switch the quoted state
+        line_start = 0
+        line_end = data.find(b'\n')
+        while line_end >= 0:
+            quoted ^= data.count(b'"', line_start, line_end) % 2 == 1
+            if not quoted:
+                return pos + line_end + 1
+            line_start = line_end + 1
+            line_end = data.find(b'\n', line_start)
+        quoted ^= data.count(b'"', line_start) % 2 == 1
+        pos += len(data)
+
+
+def shard_bounds(data_filename, num_shards, skiprows = [0,1], block_size = 2**20):
+    """
+    Goal:
+    -----
+    Split the rows of the data file in byte ranges of similar size, cut at row ends.
+    The quotes are counted up to each cut, so that a line break inside a quoted answer
+    is not taken for a row end.
+
+    Input:
+    -----
+    data_filename: csv file of the poll
+    num_shards: number of ranges
+    skiprows: rows to skip before the header (as in pandas read_csv)
+    block_size: number of bytes read at once
+
+    Ouput:
+    -----
+    bounds: list of the byte offsets, the range k being bounds[k]:bounds[k+1]
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    with open(data_filename, 'rb') as f:
+        data_start = 0
+        for row_num in range(len(skiprows) + 1):
+            data_start = row_end(f, data_start, block_size = block_size)
+        data_end = os.fstat(f.fileno()).st_size
+
+        bounds = [data_start]
+        for shard_num in range(1, num_shards):
+            cut = data_start + (data_end - data_start)*shard_num//num_shards
+            if cut <= bounds[-1]:
+                bounds.append(bounds[-1])
+                continue
+
+            # quoted state at the cut, counted from the previous row end
+            f.seek(bounds[-1])
+            quoted, pos = False, bounds[-1]
+            while pos < cut:
+                data = f.read(min(block_size, cut - pos))
+                quoted ^= data.count(b'"') % 2 == 1
+                pos += len(data)
+            bounds.append(row_end(f, cut, quoted = quoted, block_size = block_size))
+        bounds.append(data_end)
+
+    return bounds
+
+
+def count_shard(data_filename, start, stop, header):
+    """
+    Goal:
+    -----
+    Count every answer of every column of a byte range of the data file (see count_columns)
+
+    Input:
+    -----
+    data_filename: csv file of the poll
+    start: first byte of the range (start of a row)
+    stop: last byte of the range (excluded, end of a row)
+    header: list of the column headers
+
+    Ouput:
+    -----
+    counts: partial counts of the range
+    num_rows: number of rows of the range
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    with open(data_filename, 'rb') as f:
+        f.seek(start)
+        data = f.read(stop - start)
+
+    if not data.strip():
+        return [[] for name in header], 0
+
+    pd = read_csv(io.BytesIO(data), header = None, names = header, dtype = str)
+
+    return count_columns(pd), len(pd)
+
+
+def sharded_tally(data_filename, num_workers = None, num_shards = None, skiprows = [0,1], renames = default_renames):
+    """
+    Goal:
+    -----
+    Count every answer of every column of the data with a pool of processes, each one
+    counting a range of rows. The partial counts are merged in the order of the ranges,
+    so the result is the same as counting all the rows at once (see tally_class.update_tally)
+    and can be given as tally to the plot functions. If a range cannot be parsed, all the
+    rows are counted at once.
+
+    Input:
+    -----
+    data_filename: csv file of the poll
+    num_workers: number of processes (default: number of cores)
+    num_shards: number of row ranges (default: 4 per process)
+    skiprows: rows to skip before the header (as in pandas read_csv)
+    renames: dictionary of the new header of some columns
+
+    Ouput:
+    -----
+    tally: dictionary of the header, the counts per column and the number of rows (num_rows)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if num_workers is None: num_workers = os.cpu_count()
+    if num_shards is None: num_shards = 4*num_workers
+
+    header = rename_headers(list(read_csv(data_filename, skiprows = skiprows, nrows = 0)), renames)
+    bounds = shard_bounds(data_filename, num_shards, skiprows = skiprows)
+
+    try:
+        with ProcessPoolExecutor(max_workers = num_workers) as executor:
+            results = list(executor.map(count_shard, [data_filename]*num_shards, bounds[:-1], bounds[1:], [header]*num_shards))
+    except ParserError:
+        # serial count of all the rows
+        pd = read_csv(data_filename, skiprows = skiprows, dtype = str)
+        results = [(count_columns(pd), len(pd))]
+
+    counts = reduce(merge_counts, [shard_counts for shard_counts, num_rows in results])
+    num_rows = sum([num_rows for shard_counts, num_rows in results])
+
+    return dict(header = header, counts = counts, num_rows = num_rows)
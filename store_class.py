@@ -0,0 +1,261 @@
+# General imports
+# ---------------
+import json
+import numpy as np
+from pandas import factorize, isna
+
+def factorize_answers(answers):
+    """
+    Goal:
+    -----
+    Code the answers of a column in order of first appearance (as pandas unique),
+    missing answers having their own code
+
+    Input:
+    -----
+    answers: pandas series of the answers
+
+    Ouput:
+    -----
+    codes: code of each answer
+    table: list of the answers of each code (missing answers as None)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    codes, uniques = factorize(answers)
+    table = [val.item() if hasattr(val, 'item') else val for val in uniques]
+
+    # missing answers keep their position of first appearance
+    missing = codes < 0
+    if missing.any():
+        first = np.argmax(missing)
+        pos = codes[:first].max() + 1 if first > 0 else 0
+        codes = codes + (codes >= pos)
+        codes[missing] = pos
+        table.insert(pos, None)
+
+    return codes, table
+
+
+def column_codes(pd, column):
+    """
+    Goal:
+    -----
+    Get the answer codes of a column (see factorize_answers), read from the binary
+    store when the data is a store
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see open_store)
+    column: column of the data to analyse
+
+    Ouput:
+    -----
+    codes: code of each answer
+    table: list of the answers of each code (missing answers as None)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if isinstance(pd, dict):
+        return pd['codes'][pd['rows'][column]], pd['tables'][pd['rows'][column]]
+
+    return factorize_answers(pd[list(pd)[column]])
+
+
+def write_store(pd, filename, columns = None, max_values = 32):
+    """
+    Goal:
+    -----
+    Convert the closed questions of the data to a binary store of one uint8 code per
+    respondent and question (filename.bin, one block of codes per question) with the
+    code tables in a sidecar file (filename.json)
+
+    Input:
+    -----
+    pd: pandas dataframe
+    filename: file name of the store (without extension)
+    columns: columns to store (default: the columns with at most max_values answers)
+    max_values: maximum number of different answers of a closed question (at most 256)
+
+    Ouput:
+    -----
+    none
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    headers = list(pd)
+    if columns is None:
+        columns = [column for column, header in enumerate(headers) if pd[header].nunique(dropna = False) <= max_values]
+
+    codes_mat = np.memmap(filename + '.bin', dtype = np.uint8, mode = 'w+', shape = (len(columns), len(pd)))
+    tables = []
+    for row, column in enumerate(columns):
+        codes, table = factorize_answers(pd[headers[column]])
+        if len(table) > 256:
+            raise ValueError('column {} has more than 256 different answers'.format(column))
+        codes_mat[row] = codes
+        tables.append(table)
+    codes_mat.flush()
+    del codes_mat
+
+    store = dict(header = headers, columns = [int(column) for column in columns], tables = tables, shape = [len(columns), len(pd)])
+    with open(filename + '.json', 'w', encoding = 'utf-8') as f:
+        json.dump(store, f, ensure_ascii = False)
+
+
+def build_store(pd, columns = None, max_values = 32):
+    """
+    Goal:
+    -----
+    Build the binary store of the closed questions in memory, as open_store gives it
+    from the files of write_store
+
+    Input:
+    -----
+    pd: pandas dataframe
+    columns: columns to store (default: the columns with at most max_values answers)
+    max_values: maximum number of different answers of a closed question (at most 256)
+
+    Ouput:
+    -----
+    store: dictionary of the header, the stored columns, the code tables and the codes,
+           it can be given instead of the pandas dataframe to the plot functions
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    headers = list(pd)
+    if columns is None:
+        columns = [column for column, header in enumerate(headers) if pd[header].nunique(dropna = False) <= max_values]
+
+    codes_mat = np.empty((len(columns), len(pd)), dtype = np.uint8)
+    tables = []
+    for row, column in enumerate(columns):
+        codes, table = factorize_answers(pd[headers[column]])
+        if len(table) > 256:
+            raise ValueError('column {} has more than 256 different answers'.format(column))
+        codes_mat[row] = codes
+        tables.append(table)
+
+    store = dict(header = headers, columns = [int(column) for column in columns], tables = tables, shape = [len(columns), len(pd)], codes = codes_mat)
+    store['rows'] = dict((column, row) for row, column in enumerate(store['columns']))
+
+    return store
+
+
+def open_store(filename):
+    """
+    Goal:
+    -----
+    Open a binary store (see write_store) without reading the codes, which are
+    mapped in memory and only read for the questions used
+
+    Input:
+    -----
+    filename: file name of the store (without extension)
+
+    Ouput:
+    -----
+    store: dictionary of the header, the stored columns, the code tables and the memory-mapped codes,
+           it can be given instead of the pandas dataframe to the plot functions
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    with open(filename + '.json', 'r', encoding = 'utf-8') as f:
+        store = json.load(f)
+
+    store['codes'] = np.memmap(filename + '.bin', dtype = np.uint8, mode = 'r', shape = tuple(store['shape']))
+    store['rows'] = dict((column, row) for row, column in enumerate(store['columns']))
+
+    return store
+
+
+def store_values(store, column):
+    """
+    Goal:
+    -----
+    Get the answers of a stored column in order of first appearance (as pandas unique)
+
+    Input:
+    -----
+    store: binary store (see open_store)
+    column: column of the data to analyse
+
+    Ouput:
+    -----
+    list_array: array of the answers
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    table = store['tables'][store['rows'][column]]
+
+    return np.array([np.nan if val is None else val for val in table], dtype = object)
+
+
+def store_counts(store, columns, values, weights = None, mask = None):
+    """
+    Goal:
+    -----
+    Count the answers of a block of stored columns in one pass over their codes
+
+    Input:
+    -----
+    store: binary store (see open_store)
+    columns: columns of the block
+    values: answers to count (missing values are never counted)
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+
+    Ouput:
+    -----
+    sum_mat: number of answers (columns x values)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    rows = [store['rows'][column] for column in columns]
+    value_index = dict((val, val_num) for val_num, val in enumerate(values) if not isna(val))
+
+    # code to value lookup table of each column
+    lut = np.full((len(rows), 256), -1, dtype = int)
+    for row_num, row in enumerate(rows):
+        for code, val in enumerate(store['tables'][row]):
+            if val is not None and val in value_index:
+                lut[row_num, code] = value_index[val]
+
+    val_idx = lut[np.arange(len(rows))[:,np.newaxis], store['codes'][rows]]
+    keep = val_idx >= 0
+    if mask is not None:
+        keep &= mask
+    val_flat = val_idx + np.arange(len(rows))[:,np.newaxis]*len(values)
+    if weights is not None:
+        weights = np.broadcast_to(weights, val_idx.shape)[keep]
+    sum_mat = np.bincount(val_flat[keep], weights = weights, minlength = len(rows)*len(values))
+
+    return sum_mat.reshape(len(rows), len(values))
@@ -0,0 +1,868 @@
+# General imports
+# ---------------
+import os
+import io
+import re
+import json
+import hashlib
+import numpy as np
+from pandas import Categorical, DataFrame, isna, read_csv
+from store_class import factorize_answers, column_codes, store_values, store_counts
+
+# renamed headers of Figures.ipynb
+default_renames = { 104: ' autre',
+                    110: 'Branche futur supermarché',
+                    111: 'Branche épicerie',
+                    112: 'Branche communication',
+                    113: 'Branche animation et intégration',
+                    114: 'Branche zéro waste',
+                    115: 'Branche informatique',
+                    116: 'Branche comptabilité/administratif',
+                    117: 'Branche organisation interne'}
+
+# blocks of Likert items of the poll (first column, number of items, block title)
+likert_blocks = [   (5, 3, 'Les fruits et légumes'),
+                    (8, 3, 'Le vrac'),
+                    (11, 3, 'Les fromages'),
+                    (14, 3, 'Autres produits frais (ex: yahourts, pâtes)'),
+                    (17, 3, 'Autres produits (boissons, produits ménagers, etc)'),
+                    (122, 8, 'Animations')]
+
+def fold_texts(texts):
+    """
+    Goal:
+    -----
+    Lower case the texts and fold their accents (é -> e, œ -> oe), with vectorized string methods
+
+    Input:
+    -----
+    texts: pandas series of the texts
+
+    Ouput:
+    -----
+    texts: pandas series of the folded texts
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    texts = texts.astype(str).str.lower().str.replace('œ', 'oe', regex = False).str.replace('æ', 'ae', regex = False)
+
+    return texts.str.normalize('NFKD').str.encode('ascii', errors = 'ignore').str.decode('ascii')
+
+
+def rename_headers(headers, renames = default_renames):
+    """
+    Goal:
+    -----
+    Rename the headers of some columns as in Figures.ipynb
+
+    Input:
+    -----
+    headers: list of the column headers
+    renames: dictionary of the new header of some columns
+
+    Ouput:
+    -----
+    headers: list of the renamed headers
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    return [renames.get(column, header) for column, header in enumerate(headers)]
+
+
+def read_data(data_filename, skiprows = [0,1], renames = default_renames, dtype = None):
+    """
+    Goal:
+    -----
+    Load the data with pandas, the headers being renamed as in Figures.ipynb
+
+    Input:
+    -----
+    data_filename: csv file of the poll
+    skiprows: rows to skip before the header (as in pandas read_csv)
+    renames: dictionary of the new header of some columns
+    dtype: dtype of the columns (as in pandas read_csv)
+
+    Ouput:
+    -----
+    pd: pandas dataframe
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    pd = read_csv(data_filename, skiprows = skiprows, dtype = dtype)
+    pd.columns = rename_headers(list(pd), renames)
+
+    return pd
+
+
+def column_headers(pd, tally = None):
+    """
+    Goal:
+    -----
+    Get the list of the column headers of the data
+
+    Input:
+    -----
+    pd: pandas dataframe or binary store (see store_class.open_store)
+    tally: tally state (see update_tally), if given the headers are read from it
+
+    Ouput:
+    -----
+    headers: list of the column headers
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if tally is not None:
+        return list(tally['header'])
+    if isinstance(pd, dict):
+        return list(pd['header'])
+
+    return list(pd)
+
+
+def column_values(pd, column, tally = None):
+    """
+    Goal:
+    -----
+    Get the answers of a column in order of first appearance (as pandas unique)
+
+    Input:
+    -----
+    pd: pandas dataframe or binary store (see store_class.open_store)
+    column: column of the data to analyse
+    tally: tally state (see update_tally), if given the values are read from it
+
+    Ouput:
+    -----
+    list_array: array of the answers
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if tally is not None:
+        return np.array([np.nan if val is None else val for val, num in tally['counts'][column]], dtype = object)
+    if isinstance(pd, dict):
+        return store_values(pd, column)
+
+    return np.array(pd[list(pd)[column]].unique())
+
+
+def category_counts(pd, column, values, tally = None, weights = None, mask = None):
+    """
+    Goal:
+    -----
+    Count the answers of a categorical column in one pass
+
+    Input:
+    -----
+    pd: pandas dataframe or binary store (see store_class.open_store)
+    column: column of the data to analyse
+    values: answers to count (missing values are never counted)
+    tally: tally state (see update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+
+    Ouput:
+    -----
+    sum_array: number of answers per value
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    values = np.array(values, dtype = object)
+    valid = ~isna(values)
+    sum_array = np.zeros(values.size, dtype = int if weights is None else float)
+
+    if tally is not None:
+        check_tally(tally, weights, mask)
+        counts = dict(tally['counts'][column])
+        sum_array[valid] = [counts.get(val, 0) for val in values[valid]]
+        return sum_array
+    if isinstance(pd, dict):
+        return store_counts(pd, [column], values, weights = weights, mask = mask)[0]
+
+    codes = Categorical(pd[list(pd)[column]], categories = values[valid]).codes
+    keep = codes >= 0
+    if mask is not None:
+        keep &= mask
+    sum_array[valid] = np.bincount(codes[keep], weights = None if weights is None else weights[keep], minlength = valid.sum())
+
+    return sum_array
+
+
+def checkbox_counts(pd, columns, rep = 'X', tally = None, weights = None, mask = None):
+    """
+    Goal:
+    -----
+    Count the ticked boxes of a block of checkbox columns in one pass
+
+    Input:
+    -----
+    pd: pandas dataframe or binary store (see store_class.open_store)
+    columns: columns of the block
+    rep: value of a ticked box
+    tally: tally state (see update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+
+    Ouput:
+    -----
+    sum_array: number of ticked boxes per column
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    columns = list(columns)
+    if tally is not None:
+        check_tally(tally, weights, mask)
+        return np.array([dict(tally['counts'][column]).get(rep, 0) for column in columns], dtype = int)
+    if isinstance(pd, dict):
+        return store_counts(pd, columns, [rep], weights = weights, mask = mask)[:,0]
+
+    selected = checkbox_matrix(pd, columns, rep = rep)
+    if mask is not None:
+        selected &= mask[:,np.newaxis]
+    if weights is not None:
+        return weights @ selected
+
+    return selected.sum(axis = 0)
+
+
+def checkbox_matrix(pd, columns, rep = 'X'):
+    """
+    Goal:
+    -----
+    Get the ticked boxes of a block of checkbox columns as a boolean matrix
+
+    Input:
+    -----
+    pd: pandas dataframe or binary store (see store_class.open_store)
+    columns: columns of the block
+    rep: value of a ticked box
+
+    Ouput:
+    -----
+    selected: boolean matrix of the ticked boxes (respondents x columns)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    columns = list(columns)
+    if isinstance(pd, dict):
+        selected = np.zeros((pd['shape'][1], len(columns)), dtype = bool)
+        for col_num, column in enumerate(columns):
+            table = pd['tables'][pd['rows'][column]]
+            if rep in table:
+                selected[:,col_num] = pd['codes'][pd['rows'][column]] == table.index(rep)
+        return selected
+
+    # boolean boxes (see load_class.load_data) are already ticked or not
+    answers = pd.iloc[:, columns]
+    is_bool = (answers.dtypes == bool).to_numpy()
+    if is_bool.all():
+        return answers.to_numpy(dtype = bool)
+    if is_bool.any():
+        return np.column_stack([answers.iloc[:, col_num].to_numpy(dtype = bool) if is_bool[col_num] else answers.iloc[:, col_num].to_numpy() == rep
+                                for col_num in range(len(columns))])
+
+    return answers.to_numpy() == rep
+
+
+def likert_counts(pd, columns, valences, tally = None, weights = None, mask = None):
+    """
+    Goal:
+    -----
+    Count the answers of a block of columns sharing the same valences in one pass
+
+    Input:
+    -----
+    pd: pandas dataframe or binary store (see store_class.open_store)
+    columns: columns of the block
+    valences: answers to count
+    tally: tally state (see update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+
+    Ouput:
+    -----
+    sum_mat: number of answers (columns x valences)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    columns = list(columns)
+    valences = np.array(valences, dtype = object)
+    if tally is not None:
+        check_tally(tally, weights, mask)
+        return np.array([category_counts(pd, column, valences, tally = tally) for column in columns])
+    if isinstance(pd, dict):
+        return store_counts(pd, columns, valences, weights = weights, mask = mask)
+
+    answers = pd.iloc[:, columns].to_numpy()
+    codes = Categorical(answers.ravel(), categories = valences).codes.reshape(answers.shape)
+    codes_flat = codes + np.arange(len(columns))*valences.size
+    keep = codes >= 0
+    if mask is not None:
+        keep &= mask[:,np.newaxis]
+    if weights is not None:
+        weights = np.broadcast_to(weights[:,np.newaxis], codes.shape)[keep]
+    sum_mat = np.bincount(codes_flat[keep], weights = weights, minlength = len(columns)*valences.size)
+
+    return sum_mat.reshape(len(columns), valences.size)
+
+
+def item_names(pd, columns, blocks = likert_blocks, tally = None):
+    """
+    Goal:
+    -----
+    Name the Likert items by their block title and question (e.g. 'Le vrac | la qualité'),
+    the headers repeated from block to block being numbered by pandas ('la qualité.2')
+
+    Input:
+    -----
+    pd: pandas dataframe or binary store (see store_class.open_store)
+    columns: columns of the items
+    blocks: list of the blocks of items (first column, number of items, block title)
+    tally: tally state (see update_tally), if given the headers are read from it
+
+    Ouput:
+    -----
+    names: array of the item names
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    headers = column_headers(pd, tally = tally)
+    block_titles = dict((column, title) for col_start, num_col, title in blocks for column in range(col_start, col_start + num_col))
+
+    names = []
+    for column in columns:
+        question = re.sub(r'\.\d+$', '', headers[column])
+        names.append('{} | {}'.format(block_titles[column], question) if column in block_titles else question)
+
+    return np.array(names)
+
+
+def likert_summary(pd, columns, names = None, valences = ["très bien","bien","pas terrible","mauvais"], scores = [4,3,2,1], z_val = 1.96, tally = None, weights = None, mask = None, sum_mat = None):
+    """
+    Goal:
+    -----
+    Compute the summary indexes of Likert items from one count matrix of all the items:
+    mean score, top-2-box share (two first valences) and net satisfaction
+    (top-2-box minus bottom-2-box share), with their intervals: Wilson score interval
+    for the top-2-box share, normal approximation kept within the range of the index
+    for the mean and the net satisfaction (no interval for an item without answer)
+
+    Input:
+    -----
+    pd: pandas dataframe or binary store (see store_class.open_store)
+    columns: columns of the items (e.g. the 5 store sections x 3 dimensions and the 8 animations)
+    names: names of the items (default: block title and question, see item_names)
+    valences: answers from the best to the worst
+    scores: score of each valence
+    z_val: z value of the intervals (1.96 for 95 %)
+    tally: tally state (see update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+    sum_mat: counts of the items (see likert_counts), if given the data is not counted again
+
+    Ouput:
+    -----
+    table: pandas dataframe of the indexes per item, ranked by mean score
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    columns = list(columns)
+    if names is None: names = item_names(pd, columns, tally = tally)
+    scores = np.array(scores, dtype = float)
+
+    if sum_mat is None: sum_mat = likert_counts(pd, columns, valences, tally = tally, weights = weights, mask = mask)
+    num_array = sum_mat.sum(axis = 1)
+    num_safe = np.where(num_array > 0, num_array, np.nan)
+
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        ratio_mat = sum_mat/num_safe[:,np.newaxis]
+        mean_array = ratio_mat @ scores
+        mean_se = np.sqrt(np.maximum(ratio_mat @ scores**2 - mean_array**2, 0)/num_safe)
+        top_array = ratio_mat[:,:2].sum(axis = 1)
+        bottom_array = ratio_mat[:,-2:].sum(axis = 1)
+        net_array = top_array - bottom_array
+        net_se = np.sqrt(np.maximum(top_array + bottom_array - net_array**2, 0)/num_safe)
+
+        # Wilson score interval of the top-2-box share
+        z_ratio = z_val**2/num_safe
+        top_mid = (top_array + z_ratio/2)/(1 + z_ratio)
+        top_half = z_val/(1 + z_ratio)*np.sqrt(top_array*(1 - top_array)/num_safe + z_ratio/(4*num_safe))
+
+    score_min, score_max = scores.min(), scores.max()
+    table = DataFrame(dict( item = names, column = columns, n = num_array,
+                            mean = mean_array,
+                            mean_low = np.clip(mean_array - z_val*mean_se, score_min, score_max),
+                            mean_high = np.clip(mean_array + z_val*mean_se, score_min, score_max),
+                            top2 = top_array,
+                            top2_low = np.clip(top_mid - top_half, 0, 1),
+                            top2_high = np.clip(top_mid + top_half, 0, 1),
+                            net = net_array,
+                            net_low = np.clip(net_array - z_val*net_se, -1, 1),
+                            net_high = np.clip(net_array + z_val*net_se, -1, 1)))
+
+    return table.sort_values('mean', ascending = False, ignore_index = True)
+
+
+def grid_counts(pd, col_start, shape, rep = 'X', tally = None, weights = None, mask = None):
+    """
+    Goal:
+    -----
+    Count the ticked boxes of a time grid (e.g. days x parts of day) as a tensor,
+    the columns of the block following the slot axes with the last axis changing fastest
+
+    Input:
+    -----
+    pd: pandas dataframe or binary store (see store_class.open_store)
+    col_start: column where the block starts
+    shape: number of slots per axis (e.g. (7,3))
+    rep: value of a ticked box
+    tally: tally state (see update_tally), if given the counts are read from it
+    weights: weight of each respondent (see weight_class.rake_weights), default: 1
+    mask: boolean array of the respondents to count (see filter_class), default: all
+
+    Ouput:
+    -----
+    sum_grid: number of ticked boxes per slot (array of the given shape)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    columns = np.arange(col_start, col_start + int(np.prod(shape)))
+
+    return checkbox_counts(pd, columns, rep = rep, tally = tally, weights = weights, mask = mask).reshape(shape)
+
+
+def record_tally(results, title, plot, categories, sum_mat, order = None, valences = None, columns = None):
+    """
+    Goal:
+    -----
+    Keep the tally of a figure (counts, ratios, order and n) while it is drawn,
+    to export the aggregated results without the respondent data (see export_class.export_tallies)
+
+    Input:
+    -----
+    results: list of the tallies (nothing is kept if None)
+    title: title of the figure
+    plot: name of the plot function
+    categories: answers of the figure (y axis)
+    sum_mat: counts (categories) or (categories x valences)
+    order: order of the categories in the figure (default: as categories)
+    valences: answers of each category (columns of sum_mat)
+    columns: columns of the data counted
+
+    Ouput:
+    -----
+    none
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if results is None:
+        return
+
+    sum_mat = np.asarray(sum_mat, dtype = float)
+    num = sum_mat.sum(axis = -1)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        ratio_mat = sum_mat/np.expand_dims(num, -1) if sum_mat.ndim > 1 else sum_mat/num
+    if order is None: order = np.arange(len(categories))
+
+    results.append(dict(title = str(title),
+                        plot = plot,
+                        columns = None if columns is None else [int(col) for col in columns],
+                        categories = [str(cat) for cat in categories],
+                        valences = None if valences is None else [str(val) for val in valences],
+                        order = [int(cat_num) for cat_num in order],
+                        counts = sum_mat.tolist(),
+                        ratios = np.where(np.isnan(ratio_mat), None, ratio_mat).tolist(),
+                        n = num.tolist()))
+
+
+def draw_sample(pd, size, strata = None, seed = 0):
+    """
+    Goal:
+    -----
+    Draw a random sample of the respondents for a quick look at the figures (sample = ...
+    of the plot functions), uniform or stratified on a question with a proportional allocation.
+    The sample can be grown toward the exact counts with refine_sample.
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    size: number of respondents of the sample
+    strata: column of the strata (e.g. 3), default: uniform sample
+    seed: seed of the random draw
+
+    Ouput:
+    -----
+    sample: dictionary of the respondent mask and weights of the sample, its size,
+            its fraction of the respondents and its effective size (n_eff)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    num_rows = pd['shape'][1] if isinstance(pd, dict) else len(pd)
+    codes = np.zeros(num_rows, dtype = int) if strata is None else column_codes(pd, strata)[0]
+    strata_num = np.bincount(codes)
+
+    # random rank of each respondent within its stratum, the samples are nested
+    rng = np.random.default_rng(seed)
+    rank_order = np.lexsort((rng.random(num_rows), codes))
+    rank = np.empty(num_rows, dtype = int)
+    rank[rank_order] = np.arange(num_rows) - np.repeat(np.cumsum(strata_num) - strata_num, strata_num)
+
+    return refine_sample(dict(num_rows = num_rows, codes = codes, rank = rank, strata_num = strata_num), size)
+
+
+def refine_sample(sample, size):
+    """
+    Goal:
+    -----
+    Grow a sample (see draw_sample) to a new size, keeping the respondents already drawn,
+    the counts being exact once the size reaches the number of respondents
+
+    Input:
+    -----
+    sample: sample of the respondents
+    size: new number of respondents of the sample
+
+    Ouput:
+    -----
+    sample: sample of the respondents
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    strata_num = sample['strata_num']
+    size = min(size, sample['num_rows'])
+    strata_size = np.minimum(strata_num, np.maximum(1, np.round(size*strata_num/sample['num_rows']))).astype(int)
+
+    mask = sample['rank'] < strata_size[sample['codes']]
+    weights = (strata_num/np.maximum(strata_size, 1))[sample['codes']]
+    n_eff = weights[mask].sum()**2/(weights[mask]**2).sum()
+
+    return dict(sample, mask = mask, weights = weights, size = int(mask.sum()),
+                fraction = mask.sum()/sample['num_rows'], n_eff = n_eff)
+
+
+def sample_steps(pd, size, strata = None, seed = 0, factor = 2):
+    """
+    Goal:
+    -----
+    Progressive refinement: yield samples growing by a factor up to all the respondents,
+    e.g. for sample in sample_steps(data_pd, 1000): show(category_plot(..., sample = sample))
+
+    Input:
+    -----
+    pd: pandas dataframe (or binary store, see store_class.open_store)
+    size: number of respondents of the first sample
+    strata: column of the strata, default: uniform samples
+    seed: seed of the random draw
+    factor: growth of the sample size between two steps
+
+    Ouput:
+    -----
+    sample: sample of the respondents (see draw_sample) at each step
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    sample = draw_sample(pd, size, strata = strata, seed = seed)
+    yield sample
+    while sample['fraction'] < 1:
+        sample = refine_sample(sample, int(np.ceil(sample['size']*factor)))
+        yield sample
+
+
+def apply_sample(sample, weights = None, mask = None):
+    """
+    Goal:
+    -----
+    Combine the weights and the mask of a sample (see draw_sample) with the ones
+    given to a plot function
+
+    Input:
+    -----
+    sample: sample of the respondents (nothing is changed if None)
+    weights: weight of each respondent, default: 1
+    mask: boolean array of the respondents to count, default: all
+
+    Ouput:
+    -----
+    weights: weight of each respondent
+    mask: boolean array of the respondents to count
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if sample is None:
+        return weights, mask
+
+    weights = sample['weights'] if weights is None else sample['weights']*weights
+    mask = sample['mask'] if mask is None else sample['mask'] & mask
+
+    return weights, mask
+
+
+def margin_labels(ratio, num, sample, z_val = 1.96):
+    """
+    Goal:
+    -----
+    Write the sampling error of the ratios of a figure drawn from a sample (see draw_sample),
+    with the finite population correction
+
+    Input:
+    -----
+    ratio: ratios of the figure
+    num: estimated number of answers of the ratios (denominator)
+    sample: sample of the respondents, if None or complete no error is written
+    z_val: z value of the error (1.96 for 95 %)
+
+    Ouput:
+    -----
+    txt_margin: array of the error texts (e.g. " ± 3")
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    ratio = np.nan_to_num(np.asarray(ratio, dtype = float))
+    if sample is None or sample['fraction'] >= 1:
+        return np.full(ratio.shape, '', dtype = object)
+
+    num_eff = np.maximum(sample['n_eff']*np.asarray(num, dtype = float)/sample['num_rows'], 1)
+    margin = z_val*np.sqrt(ratio*(1 - ratio)/num_eff*(1 - sample['fraction']))
+
+    return np.array([" ± {:1.0f}".format(val*100) for val in np.broadcast_to(margin, ratio.shape).ravel()], dtype = object).reshape(ratio.shape)
+
+
+def check_tally(tally, weights = None, mask = None):
+    """
+    Goal:
+    -----
+    Check that the counts can be read from a tally state, which only keeps the
+    total counts and not the answers of each respondent
+
+    Input:
+    -----
+    tally: tally state (see update_tally)
+    weights: weight of each respondent
+    mask: boolean array of the respondents to count
+
+    Ouput:
+    -----
+    none
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if weights is not None or mask is not None:
+        raise ValueError('respondent weights and masks need the data, they cannot be applied to a tally state')
+
+
+def count_columns(pd):
+    """
+    Goal:
+    -----
+    Count every answer of every column, in order of first appearance
+
+    Input:
+    -----
+    pd: pandas dataframe
+
+    Ouput:
+    -----
+    counts: list per column of [answer, number] pairs (missing answers as None)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    counts = []
+    for header in list(pd):
+        codes, table = factorize_answers(pd[header])
+        sum_array = np.bincount(codes, minlength = len(table))
+        counts.append([[val, int(num)] for val, num in zip(table, sum_array)])
+
+    return counts
+
+
+def merge_counts(counts, new_counts):
+    """
+    Goal:
+    -----
+    Merge two lists of column counts (see count_columns), the first one coming first in the data
+
+    Input:
+    -----
+    counts: counts of the first rows
+    new_counts: counts of the following rows
+
+    Ouput:
+    -----
+    counts: merged counts
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    merged = []
+    for pairs, new_pairs in zip(counts, new_counts):
+        col_counts = dict((val, num) for val, num in pairs)
+        for val, num in new_pairs:
+            col_counts[val] = col_counts.get(val, 0) + num
+        merged.append([[val, num] for val, num in col_counts.items()])
+
+    return merged
+
+
+def update_tally(data_filename, state_filename, skiprows = [0,1], renames = default_renames, block_size = 2**20):
+    """
+    Goal:
+    -----
+    Update the tally state saved on disk with the rows appended to the data file.
+    Only the bytes after the saved offset are parsed and counted, the rows already
+    counted are checked with their sha1 hash and everything is recounted if they or the
+    headers changed. The headers are renamed as in Figures.ipynb. Only complete rows
+    are counted, the offset stopping at the end of the last one.
+
+    Input:
+    -----
+    data_filename: csv file of the poll
+    state_filename: json file of the tally state
+    skiprows: rows to skip before the header (as in pandas read_csv)
+    renames: dictionary of the new header of some columns
+    block_size: size of the blocks read to check the hash
+
+    Ouput:
+    -----
+    tally: dictionary of the header, the counts per column (see count_columns),
+           the number of rows (num_rows), the byte offset and the hash of the counted data
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    header = rename_headers(list(read_csv(data_filename, skiprows = skiprows, nrows = 0)), renames)
+
+    tally = None
+    if os.path.exists(state_filename):
+        with open(state_filename, 'r', encoding = 'utf-8') as f:
+            tally = json.load(f)
+        if tally['header'] != header:
+            tally = None
+
+    with open(data_filename, 'rb') as f:
+
+        # check the rows already counted
+        sha = hashlib.sha1()
+        if tally is not None:
+            remain = tally['offset']
+            while remain > 0:
+                block = f.read(min(remain, block_size))
+                if not block: break
+                sha.update(block)
+                remain -= len(block)
+
+            if remain > 0 or sha.hexdigest() != tally['hash']:
+                tally = None
+                sha = hashlib.sha1()
+                f.seek(0)
+
+        # read the appended rows
+        offset = 0 if tally is None else tally['offset']
+        new_data = f.read()
+
+        # complete rows only: a last row still being written is counted at the next update
+        row_end = new_data.rfind(b'\n')
+        while row_end >= 0 and new_data.count(b'"', 0, row_end) % 2 == 1:
+            row_end = new_data.rfind(b'\n', 0, row_end)
+        new_data = new_data[:row_end + 1]
+        sha.update(new_data)
+
+    if tally is None:
+        pd = read_csv(io.BytesIO(new_data), skiprows = skiprows, dtype = str)
+        tally = dict(header = header, counts = count_columns(pd), num_rows = len(pd))
+    elif new_data.strip():
+        pd = read_csv(io.BytesIO(new_data), header = None, names = tally['header'], dtype = str)
+        tally['counts'] = merge_counts(tally['counts'], count_columns(pd))
+        tally['num_rows'] += len(pd)
+
+    tally['offset'] = offset + len(new_data)
+    tally['hash'] = sha.hexdigest()
+
+    with open(state_filename, 'w', encoding = 'utf-8') as f:
+        json.dump(tally, f, ensure_ascii = False)
+
+    return tally
@@ -0,0 +1,468 @@
+# General imports
+# ---------------
+import numpy as np
+from pandas import DataFrame, Series
+from pandas.util import hash_array
+from bokeh.io import show
+from bokeh.plotting import figure
+from bokeh.models import ColumnDataSource
+from layout_class import bar_plot_height, bar_colors
+from tally_class import fold_texts
+
+# french stop words (accents folded)
+stop_words = ['a','ai','aie','ainsi','alors','as','au','aucun','aussi','autre','aux','avait','avec','avez','avoir','avons',
+              'bien','c','ca','car','ce','ceci','cela','celle','celles','celui','ces','cet','cette','chez','comme','d','dans',
+              'de','des','deja','donc','du','elle','elles','en','encore','entre','est','et','etait','ete','etre','eu','eux',
+              'fait','faire','faut','il','ils','j','je','jusqu','l','la','le','les','leur','leurs','lui','m','ma','mais','me',
+              'meme','mes','moi','moins','mon','n','ne','ni','non','nos','notre','nous','on','ont','ou','oui','par','parce',
+              'pas','peu','peut','plus','pour','pourquoi','qu','quand','que','quel','quelle','quelque','quelques','qui','quoi',
+              's','sa','sans','se','ses','si','son','sont','sous','suis','sur','t','ta','te','tes','toi','ton','tous','tout',
+              'toute','toutes','tres','tu','un','une','vers','vos','votre','vous','y']
+
+def tokenize(texts, stop = stop_words, min_length = 2):
+    """
+    Goal:
+    -----
+    Split the folded texts in words, without the stop words and the short words
+
+    Input:
+    -----
+    texts: pandas series of the texts (one comment per row)
+    stop: list of the stop words (accents folded)
+    min_length: minimum number of letters of a word
+
+    Ouput:
+    -----
+    doc_array: comment number of each word
+    token_array: array of the words, in the order of the comments
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    tokens = fold_texts(texts).reset_index(drop = True).str.findall(r'[a-z0-9]+').explode().dropna()
+    keep = (tokens.str.len() >= min_length) & ~tokens.isin(stop)
+    tokens = tokens[keep]
+
+    return tokens.index.to_numpy(), tokens.to_numpy(dtype = object)
+
+
+def ngram_counts(pd, column, n = 1, num_buckets = 2**20, chunk_size = 100000, stop = stop_words, min_length = 2):
+    """
+    Goal:
+    -----
+    Count the comments of a free question using each word (n = 1) or each sequence of n words
+    (bigrams for n = 2). The n-grams are formed on all the words of the comments, then the
+    ones starting or ending with a stop word or a short word are left out ('manque de temps'
+    is kept, 'manque de' is not and 'manque temps' is never formed). The n-grams are hashed in
+    a fixed number of buckets and the comments read by chunks, so that the memory is bounded
+    whatever the number of comments.
+
+    Input:
+    -----
+    pd: pandas dataframe
+    column: column of the free question
+    n: number of words of the n-grams
+    num_buckets: number of hash buckets (rare collisions merge two n-grams)
+    chunk_size: number of comments tokenized at once
+    stop: list of the stop words (accents folded)
+    min_length: minimum number of letters of the first and last words of the n-grams
+
+    Ouput:
+    -----
+    ngram_array: n-grams, ranked by number of comments
+    sum_array: number of comments using each n-gram
+    num_comments: number of comments
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    texts = pd[list(pd)[column]].dropna()
+    sum_array = np.zeros(num_buckets, dtype = np.int64)
+    ngram_array = np.full(num_buckets, None, dtype = object)
+
+    for chunk_start in range(0, len(texts), chunk_size):
+        doc_array, token_array = tokenize(texts.iloc[chunk_start:chunk_start + chunk_size], stop = [], min_length = 1)
+        if token_array.size < n:
+            continue
+        tokens = Series(token_array)
+        is_stop = (tokens.isin(stop) | (tokens.str.len() < min_length)).to_numpy()
+
+        # combine the hashes of n successive words of the same comment
+        hash_tokens = hash_array(token_array)
+        num_gram = token_array.size - n + 1
+        hash_grams = hash_tokens[:num_gram].copy()
+        for word_num in range(1, n):
+            hash_grams = hash_grams*np.uint64(1000003) ^ hash_tokens[word_num:word_num + num_gram]
+        same_doc = doc_array[:num_gram] == doc_array[n - 1:n - 1 + num_gram]
+        keep = same_doc & ~is_stop[:num_gram] & ~is_stop[n - 1:n - 1 + num_gram]
+        buckets = (hash_grams % np.uint64(num_buckets)).astype(np.int64)[keep]
+        gram_pos = np.flatnonzero(keep)
+
+        # one count per comment
+        doc_buckets = np.unique(doc_array[gram_pos]*num_buckets + buckets)
+        sum_array += np.bincount(doc_buckets % num_buckets, minlength = num_buckets)
+
+        # name the new buckets
+        new_buckets, new_pos = np.unique(buckets, return_index = True)
+        unnamed = np.array([ngram_array[bucket] is None for bucket in new_buckets], dtype = bool)
+        for bucket, pos in zip(new_buckets[unnamed], gram_pos[new_pos[unnamed]]):
+            ngram_array[bucket] = ' '.join(token_array[pos:pos + n])
+
+    rank = np.argsort(-sum_array, kind = 'stable')
+    rank = rank[sum_array[rank] > 0]
+
+    return ngram_array[rank].astype(str), sum_array[rank], len(texts)
+
+
+def ranked_bar_plot(cat_array, sum_array, num_total, cmap, title = 'title', show_plot = False):
+    """
+    Goal:
+    -----
+    Plot figure of ranked horizontal bars (as free_question_plot), the first answer on top
+
+    Input:
+    -----
+    cat_array: names of the bars, ranked
+    sum_array: number of comments of each bar
+    num_total: number of comments (denominator of the ratios)
+    cmap : colormap
+    title: title of the figure
+    show_plot: if False (default) do not show the figure
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    cat_array, sum_array = np.array(cat_array), np.array(sum_array)
+    ratio_array = sum_array/max(num_total, 1)
+
+    # basic settings
+    plot_width = 1000
+    num_bar = max(len(cat_array), 1)
+    val_bar = 40
+    plot_height = bar_plot_height(num_bar, val_bar)
+    bar_height = 0.8
+    x_range = (0, 1.5)
+
+    # define text addition to plot
+    txt_val = []
+    for ratio,num in zip(ratio_array,sum_array):
+        txt_val.append("  {:1.0f} % (n = {:1.0f})".format(ratio*100,num))
+    txt_val = np.array(txt_val)
+
+    # first on top
+    dict_ds = dict( x_val = ratio_array[::-1],
+                    y_val = cat_array[::-1],
+                    txt_val = txt_val[::-1],
+                    color = bar_colors(cmap, len(cat_array))[::-1])
+
+    source = ColumnDataSource(data = dict_ds)
+    fig = figure(x_range = x_range, y_range = list(cat_array[::-1]), plot_width = plot_width,
+                 plot_height = plot_height,title = title)
+
+    fig.hbar(y = 'y_val', left = 0, right = 'x_val', height = bar_height, color = 'color', source = source)
+    fig.text(x = 'x_val', y = 'y_val',text = 'txt_val',text_font_style = 'normal', text_font_size = '10pt',text_align = 'left',text_baseline = 'middle',source = source)
+
+    fig.xaxis.axis_label = '';                          fig.toolbar_location = None;
+    fig.yaxis.axis_label = '';                          fig.grid.grid_line_color = None;
+    fig.axis.minor_tick_in = 0;                         fig.axis.minor_tick_out = 0;
+    fig.axis.major_tick_in = 0;                         fig.axis.major_tick_out = 0;
+    fig.outline_line_alpha = 0;                         fig.background_fill_color = (255,255,255);
+    fig.axis.major_label_text_font_style = 'italic';    fig.yaxis.major_label_text_font_size = '10pt';
+    fig.outline_line_alpha = 0;                         fig.xaxis.major_label_text_font_size = '0pt';
+    fig.axis.axis_line_color = None;                    fig.title.text_font_size = '10pt';
+    fig.y_range.range_padding = 0;
+
+    if show_plot == True:
+        show(fig)
+
+    return fig
+
+
+def ngram_plot(pd, column, cmap, title = 'title', n = 1, max_terms = 15, num_buckets = 2**20, show_plot = False):
+    """
+    Goal:
+    -----
+    Plot figure of the words (or n-grams) the most used in the answers of a free question,
+    as ranked horizontal bars (share of the comments using each one)
+
+    Input:
+    -----
+    pd: pandas dataframe
+    column: column of the free question (e.g. 20, 21, 58, 98, 105-107, 120, 130, 133)
+    cmap : colormap
+    title: title of the figure
+    n: number of words of the n-grams (1: words, 2: bigrams)
+    max_terms: number of n-grams drawn
+    num_buckets: number of hash buckets (see ngram_counts)
+    show_plot: if False (default) do not show the figure
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    ngram_array, sum_array, num_comments = ngram_counts(pd, column, n = n, num_buckets = num_buckets)
+    ngram_array, sum_array = ngram_array[:max_terms], sum_array[:max_terms]
+
+    return ranked_bar_plot(ngram_array, sum_array, num_comments, cmap, title = title, show_plot = show_plot)
+
+
+def save_ngrams(pd, columns, filename, n_list = [1,2], max_terms = 50, num_buckets = 2**20):
+    """
+    Goal:
+    -----
+    Save the words and n-grams the most used in the answers of the free questions in a csv file
+    (one row per question, n-gram length and rank)
+
+    Input:
+    -----
+    pd: pandas dataframe
+    columns: columns of the free questions
+    filename: csv file
+    n_list: numbers of words of the n-grams
+    max_terms: number of n-grams saved per question and length
+    num_buckets: number of hash buckets (see ngram_counts)
+
+    Ouput:
+    -----
+    table: pandas dataframe of the n-grams
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    rows = []
+    for column in columns:
+        for n in n_list:
+            ngram_array, sum_array, num_comments = ngram_counts(pd, column, n = n, num_buckets = num_buckets)
+            for rank, (ngram, num) in enumerate(zip(ngram_array[:max_terms], sum_array[:max_terms])):
+                rows.append(dict(column = column, question = list(pd)[column], n = n, rank = rank + 1,
+                                 ngram = ngram, count = num, ratio = num/max(num_comments, 1)))
+
+    table = DataFrame(rows, columns = ['column','question','n','rank','ngram','count','ratio'])
+    table.to_csv(filename, index = False)
+
+    return table
+
+
+# topics of the comments and their terms (accents folded)
+default_lexicon = { 'vrac': ['vrac','en vrac','bocal','bocaux','contenant','contenants','sans emballage','zero dechet','zero waste','emballage','emballages'],
+                    'viande/poisson': ['viande','viandes','poisson','poissons','boucherie','volaille','poulet','boeuf','porc','jambon','charcuterie','saucisson','fruits de mer'],
+                    'prix': ['prix','cher','chere','chers','cheres','trop cher','tarif','tarifs','cout','couteux','abordable','budget','marge','moins cher'],
+                    'horaires': ['horaire','horaires','ouverture','ouvert','fermeture','ferme','samedi','dimanche','soir','matin','week end','weekend'],
+                    'bio': ['bio','biologique','biologiques','agriculture biologique','label','labels','local','locaux','locale','producteur','producteurs']}
+
+def build_automaton(lexicon = default_lexicon):
+    """
+    Goal:
+    -----
+    Build the Aho-Corasick automaton of all the terms of a lexicon, to find every term
+    of every topic in one pass over a text
+
+    Input:
+    -----
+    lexicon: dictionary of the terms (accents folded) of each topic
+
+    Ouput:
+    -----
+    automaton: dictionary of the topics, the transitions (goto), the failure links (fail)
+               and the (topic, term length) found at each state (out)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    topics = list(lexicon)
+    goto, fail, out = [{}], [0], [[]]
+
+    # trie of the terms
+    for topic_num, topic in enumerate(topics):
+        for term in lexicon[topic]:
+            state = 0
+            for char in term:
+                if char not in goto[state]:
+                    goto.append({}); fail.append(0); out.append([])
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            out[state].append((topic_num, len(term)))
+
+    # failure links, breadth first
+    queue = list(goto[0].values())
+    for state in queue:
+        for char, next_state in goto[state].items():
+            queue.append(next_state)
+            fail_state = fail[state]
+            while fail_state and char not in goto[fail_state]:
+                fail_state = fail[fail_state]
+            fail[next_state] = goto[fail_state].get(char, 0)
+            out[next_state] = out[next_state] + out[fail[next_state]]
+
+    return dict(topics = topics, goto = goto, fail = fail, out = out)
+
+
+def tag_text(text, automaton):
+    """
+    Goal:
+    -----
+    Find the topics of a folded text in one pass of the automaton, the terms
+    only matching whole words
+
+    Input:
+    -----
+    text: folded text (see tally_class.fold_texts)
+    automaton: automaton of the lexicon (see build_automaton)
+
+    Ouput:
+    -----
+    topic_array: boolean array of the topics found
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    goto, fail, out = automaton['goto'], automaton['fail'], automaton['out']
+    topic_array = np.zeros(len(automaton['topics']), dtype = bool)
+    text_len = len(text)
+
+    state = 0
+    for pos, char in enumerate(text):
+        while state and char not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(char, 0)
+        for topic_num, term_len in out[state]:
+            start = pos - term_len + 1
+            if (start == 0 or not text[start - 1].isalnum()) and (pos + 1 == text_len or not text[pos + 1].isalnum()):
+                topic_array[topic_num] = True
+
+    return topic_array
+
+
+def tag_comments(pd, column, lexicon = default_lexicon, automaton = None):
+    """
+    Goal:
+    -----
+    Tag the answers of a free question with the topics of a lexicon
+
+    Input:
+    -----
+    pd: pandas dataframe
+    column: column of the free question
+    lexicon: dictionary of the terms (accents folded) of each topic
+    automaton: automaton of the lexicon (default: built from the lexicon, see build_automaton)
+
+    Ouput:
+    -----
+    tag_mat: boolean matrix of the topics of each comment (comments x topics)
+    texts: pandas series of the comments
+    topics: list of the topics
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if automaton is None: automaton = build_automaton(lexicon)
+    texts = pd[list(pd)[column]].dropna()
+    folded = fold_texts(texts).str.replace(r'\s+', ' ', regex = True)
+
+    tag_mat = np.zeros((len(texts), len(automaton['topics'])), dtype = bool)
+    for text_num, text in enumerate(folded):
+        tag_mat[text_num] = tag_text(text, automaton)
+
+    return tag_mat, texts, automaton['topics']
+
+
+def topic_plot(pd, column, cmap, title = 'title', lexicon = default_lexicon, show_plot = False):
+    """
+    Goal:
+    -----
+    Plot figure of the topics of the answers of a free question (share of the comments
+    tagged with each topic, see tag_comments), as ranked horizontal bars
+
+    Input:
+    -----
+    pd: pandas dataframe
+    column: column of the free question (e.g. 20, 21, 58, 98, 105-107, 120, 130, 133)
+    cmap : colormap
+    title: title of the figure
+    lexicon: dictionary of the terms (accents folded) of each topic
+    show_plot: if False (default) do not show the figure
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    tag_mat, texts, topics = tag_comments(pd, column, lexicon = lexicon)
+    sum_array = tag_mat.sum(axis = 0)
+    rank = np.argsort(-sum_array, kind = 'stable')
+
+    return ranked_bar_plot(np.array(topics)[rank], sum_array[rank], len(texts), cmap, title = title, show_plot = show_plot)
+
+
+def save_tags(pd, columns, filename, lexicon = default_lexicon):
+    """
+    Goal:
+    -----
+    Save the answers of the free questions with their topics in a csv file
+    (one row per comment, topics separated by ';')
+
+    Input:
+    -----
+    pd: pandas dataframe
+    columns: columns of the free questions
+    filename: csv file
+    lexicon: dictionary of the terms (accents folded) of each topic
+
+    Ouput:
+    -----
+    table: pandas dataframe of the tagged comments
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    automaton = build_automaton(lexicon)
+    rows = []
+    for column in columns:
+        tag_mat, texts, topics = tag_comments(pd, column, automaton = automaton)
+        for row, text, tags in zip(texts.index, texts, tag_mat):
+            rows.append(dict(column = column, question = list(pd)[column], row = row, comment = text,
+                             topics = ';'.join(np.array(topics)[tags])))
+
+    table = DataFrame(rows, columns = ['column','question','row','comment','topics'])
+    table.to_csv(filename, index = False)
+
+    return table
@@ -0,0 +1,374 @@
+# General imports
+# ---------------
+import numpy as np
+from pandas import Categorical, isna, read_csv, concat
+from bokeh.io import show
+from bokeh.plotting import figure
+from bokeh.models import ColumnDataSource, FactorRange
+from bokeh.palettes import brewer
+from layout_class import bar_colors
+
+def question_keys(filename):
+    """
+    Goal:
+    -----
+    Build a key per question from the two header rows skipped by the analysis
+    (group title row and question row), the group title is only used for the
+    questions which text is repeated in the questionnaire (e.g. 'lundi', 'le prix')
+
+    Input:
+    -----
+    filename: csv file of the poll
+
+    Ouput:
+    -----
+    keys: list of the question keys
+    questions: list of the question texts
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    header_pd = read_csv(filename, header = None, nrows = 3, dtype = str, keep_default_na = False)
+    groups = header_pd.iloc[1].to_numpy()
+    questions = list(header_pd.iloc[2].to_numpy())
+
+    keys = []
+    num_seen = {}
+    group = ''
+    for group_txt, question in zip(groups, questions):
+        if group_txt != '': group = group_txt
+        if questions.count(question) == 1:
+            key = question
+        else:
+            key = '{} | {}'.format(group, question)
+            num_seen[key] = num_seen.get(key, 0) + 1
+            if num_seen[key] > 1: key = '{} #{}'.format(key, num_seen[key])
+        keys.append(key)
+
+    return keys, questions
+
+
+def load_waves(filenames, labels = None):
+    """
+    Goal:
+    -----
+    Load several exports of the poll and align their questions on the first one
+
+    Input:
+    -----
+    filenames: list of csv files of the poll, from the reference wave to the latest
+    labels: list of the wave names (default: file names)
+
+    Ouput:
+    -----
+    pd: pandas dataframe of all the waves with the columns of the first wave
+        (questions missing in a wave are left empty)
+    wave_array: wave index of each row
+    labels: list of the wave names
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    if labels is None: labels = list(filenames)
+
+    wave_pds = []
+    for filename in filenames:
+        keys, questions = question_keys(filename)
+        wave_pd = read_csv(filename, skiprows = 3, header = None, names = keys)
+        if not wave_pds: ref_keys = keys
+        wave_pds.append(wave_pd.reindex(columns = ref_keys))
+
+    wave_array = np.repeat(np.arange(len(wave_pds)), [len(wave_pd) for wave_pd in wave_pds])
+    pd = concat(wave_pds, ignore_index = True)
+
+    return pd, wave_array, list(labels)
+
+
+def wave_counts(pd, wave_array, columns, values):
+    """
+    Goal:
+    -----
+    Count the answers of a block of columns for all waves in one pass
+
+    Input:
+    -----
+    pd: pandas dataframe of the waves (see load_waves)
+    wave_array: wave index of each row
+    columns: columns of the block
+    values: answers to count
+
+    Ouput:
+    -----
+    sum_mat: number of answers (waves x columns x values)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    columns = list(columns)
+    values = np.array(values, dtype = object)
+    valid = ~isna(values)
+    num_waves = wave_array.max() + 1
+
+    answers = pd.iloc[:, columns].to_numpy()
+    codes = Categorical(answers.ravel(), categories = values[valid]).codes.reshape(answers.shape)
+    codes_flat = (wave_array[:,np.newaxis]*len(columns) + np.arange(len(columns)))*valid.sum() + codes
+    sum_valid = np.bincount(codes_flat[codes >= 0], minlength = num_waves*len(columns)*valid.sum())
+
+    sum_mat = np.zeros((num_waves, len(columns), values.size), dtype = int)
+    sum_mat[:,:,valid] = sum_valid.reshape(num_waves, len(columns), valid.sum())
+
+    return sum_mat
+
+
+def wave_bar_plot(cat_array, sum_mat, labels, order, cmap, title = 'title', mode = 'side', show_plot = False):
+    """
+    Goal:
+    -----
+    Plot figure comparing the waves for categorical or free question plots
+
+    Input:
+    -----
+    cat_array: names of the categories
+    sum_mat: number of answers (waves x categories)
+    labels: list of the wave names
+    order: order list of the y axis
+    cmap: colormap
+    title: title of the figure
+    mode: 'side' to draw the waves side by side, 'delta' to draw the change between the first and the last wave
+    show_plot: if False (default) do not show the figure
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    ratio_mat = sum_mat/sum_mat.sum(axis = 1, keepdims = True)
+    cat_array = np.array(cat_array)[order]
+    ratio_mat = ratio_mat[:,order]
+    sum_mat = sum_mat[:,order]
+    num_waves = len(labels)
+
+    # basic settings
+    plot_width = 1000
+    bar_height = 0.8
+    color_two = np.array(brewer[cmap][6])[[1,-2]]
+
+    if mode == 'side':
+        val_bar = 25
+        factors = [(cat, label) for cat in cat_array for label in labels]
+        x_range = (0, 1.5)
+        x_val = ratio_mat.T.ravel()
+        txt_val = np.array(["  {:1.0f} % (n = {:1.0f})".format(ratio*100,num) for ratio,num in zip(x_val, sum_mat.T.ravel())])
+        color_waves = bar_colors(cmap, num_waves)
+        color = np.tile(color_waves, cat_array.size)
+        x_txt = x_val
+
+    elif mode == 'delta':
+        val_bar = 40
+        factors = list(cat_array)
+        x_val = ratio_mat[-1] - ratio_mat[0]
+        x_max = max(np.nan_to_num(np.abs(x_val)).max()*2, 0.1)
+        x_range = (-x_max, x_max)
+        txt_val = np.array(["  {:+1.0f} pts (n = {:1.0f} → {:1.0f})".format(delta*100,num0,num1) for delta,num0,num1 in zip(x_val, sum_mat[0], sum_mat[-1])])
+        color = np.where(x_val >= 0, color_two[1], color_two[0])
+        x_txt = np.maximum(np.nan_to_num(x_val), 0)
+        title = '{} ({} → {})'.format(title, labels[0], labels[-1])
+
+    plot_height = val_bar*len(factors) + 40
+
+    dict_ds = dict( x_val = x_val,
+                    y_val = factors,
+                    x_txt = x_txt,
+                    txt_val = txt_val,
+                    color = color)
+
+    source = ColumnDataSource(data = dict_ds)
+    fig = figure(x_range = x_range, y_range = FactorRange(*factors), plot_width = plot_width,
+                 plot_height = plot_height, title = title)
+
+    fig.hbar(y = 'y_val', left = 0, right = 'x_val', height = bar_height, color = 'color', source = source)
+    fig.text(x = 'x_txt', y = 'y_val',text = 'txt_val',text_font_style = 'normal', text_font_size = '10pt',text_align = 'left',text_baseline = 'middle',source = source)
+
+    fig.xaxis.axis_label = '';                          fig.toolbar_location = None;
+    fig.yaxis.axis_label = '';                          fig.grid.grid_line_color = None;
+    fig.axis.minor_tick_in = 0;                         fig.axis.minor_tick_out = 0;
+    fig.axis.major_tick_in = 0;                         fig.axis.major_tick_out = 0;
+    fig.outline_line_alpha = 0;                         fig.background_fill_color = (255,255,255);
+    fig.axis.major_label_text_font_style = 'italic';    fig.yaxis.major_label_text_font_size = '10pt';
+    fig.outline_line_alpha = 0;                         fig.xaxis.major_label_text_font_size = '0pt';
+    fig.axis.axis_line_color = None;                    fig.title.text_font_size = '10pt';
+    fig.y_range.range_padding = 0;
+
+    if show_plot:
+        show(fig)
+
+    return fig
+
+
+def wave_category_plot(pd, wave_array, labels, column, order, cmap, title = 'title', force_list = False, list_array_force = [], mode = 'side', show_plot = False):
+    """
+    Goal:
+    -----
+    Plot figure of the column to analyse for categorical plots, for all waves
+
+    Input:
+    -----
+    pd: pandas dataframe of the waves (see load_waves)
+    wave_array: wave index of each row
+    labels: list of the wave names
+    column: column of the data to analyse
+    order: order list of the y axis
+    cmap: colormap
+    title: title of the figure
+    force_list: if True put the value of the list
+    list_array_force: value of the list
+    mode: 'side' or 'delta' (see wave_bar_plot)
+    show_plot: if False (default) do not show the figure
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    # answers of the reference wave in order of first appearance
+    list_array = np.array(pd[list(pd)[column]][wave_array == 0].unique())
+    if force_list == True:
+        list_array = np.array(list_array_force)
+
+    sum_mat = wave_counts(pd, wave_array, [column], list_array)[:,0,:]
+
+    return wave_bar_plot(list_array, sum_mat, labels, order, cmap, title = title, mode = mode, show_plot = show_plot)
+
+
+def wave_free_question_plot(pd, wave_array, labels, columns, order, cmap, title = 'title', mode = 'side', show_plot = False):
+    """
+    Goal:
+    -----
+    Plot figure of the columns to analyse for free question plots, for all waves
+
+    Input:
+    -----
+    pd: pandas dataframe of the waves (see load_waves)
+    wave_array: wave index of each row
+    labels: list of the wave names
+    columns: columns of the data to analyse
+    order: order list of the y axis
+    cmap: colormap
+    title: title of the figure
+    mode: 'side' or 'delta' (see wave_bar_plot)
+    show_plot: if False (default) do not show the figure
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    list_select = ['O','X']
+    sum_mat = wave_counts(pd, wave_array, columns, [list_select[1]])[:,:,0]
+    cat_array = np.array([list(pd)[column].split(' | ')[-1] for column in columns])
+
+    return wave_bar_plot(cat_array, sum_mat, labels, order, cmap, title = title, mode = mode, show_plot = show_plot)
+
+
+def wave_quality_plot(pd, wave_array, labels, column, categories, order, cmap, title = 'title', show_plot = False):
+    """
+    Goal:
+    -----
+    Plot figure of the quality plots (stacked valences) with the waves side by side
+
+    Input:
+    -----
+    pd: pandas dataframe of the waves (see load_waves)
+    wave_array: wave index of each row
+    labels: list of the wave names
+    column: starter column
+    categories: names of the rated items (e.g. ['le choix','la qualité','le prix'])
+    order: order list of the y axis
+    cmap: colormap
+    title: title of the figure
+    show_plot: if False (default) do not show the figure
+
+    Ouput:
+    -----
+    fig: bokeh figure
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    categories = np.array(categories)
+    valences = np.array(["très bien","bien","pas terrible","mauvais"])
+
+    sum_mat = wave_counts(pd, wave_array, np.arange(column, column + categories.size), valences)
+    ratio_mat = sum_mat/sum_mat.sum(axis = 2, keepdims = True)
+
+    # Draw figure
+    # -----------
+    val_bar = 25
+    plot_width = 1000
+    bar_height = 0.8
+    x_range = (0, 1.5)
+
+    factors = [(cat, label) for cat in categories[order] for label in labels]
+    plot_height = val_bar*len(factors) + 40
+    dict_ds = {'factors': factors}
+    for val_num, valence in enumerate(valences):
+        dict_ds[valence] = ratio_mat[:,order,val_num].T.ravel()
+
+    source = ColumnDataSource(data = dict_ds)
+    fig = figure(x_range = x_range, y_range = FactorRange(*factors),
+                 plot_width = plot_width, plot_height = plot_height, title = title)
+
+    color_stack = tuple(np.array(brewer[cmap][4+1])[[3,2,1,0]])
+    fig.hbar_stack(valences, y = 'factors', color = color_stack, height = bar_height,legend_label=["%s" % valence for valence in valences],source = source)
+
+    x_cum = np.zeros(len(factors))
+    for valence in valences:
+        ratio = dict_ds[valence]
+        txt_val = np.array(["{:1.0f} %".format(val*100) if val*100 > 1 else "" for val in ratio])
+        fig.text(x = x_cum + ratio/2, y = factors, text = txt_val,text_font_style = 'normal',text_font_size = '10pt',text_align = 'center',text_baseline = 'middle')
+        x_cum = x_cum + ratio
+
+    fig.y_range.range_padding = 0;                     fig.xaxis.axis_label = ''
+    fig.toolbar_location = None;                       fig.yaxis.axis_label = ''
+    fig.grid.grid_line_color = None;                   fig.axis.minor_tick_in = 0
+    fig.axis.minor_tick_out = 0;                       fig.axis.major_tick_in = 0
+    fig.axis.major_tick_out = 0;                       fig.outline_line_alpha = 0
+    fig.background_fill_color = (255,255,255);         fig.axis.major_label_text_font_style = 'italic'
+    fig.yaxis.major_label_text_font_size = '10pt';     fig.outline_line_alpha = 0
+    fig.xaxis.major_label_text_font_size = '0pt';      fig.axis.axis_line_color = None
+    fig.title.text_font_size = '10pt';                 fig.legend.location = "top_right"
+    fig.legend.label_text_font_style = 'italic';       fig.legend.margin = 0
+    fig.legend.title_text_font_style ='bold';          fig.legend.border_line_alpha = 0
+    fig.legend.padding = 0
+
+    if show_plot == True:
+        show(fig)
+
+    return fig
@@ -0,0 +1,80 @@
+# General imports
+# ---------------
+import numpy as np
+from pandas import Categorical
+
+def rake_weights(pd, columns, targets, max_iter = 100, tol = 1e-6):
+    """
+    Goal:
+    -----
+    Compute the weight of each respondent by iterative proportional fitting (raking),
+    so that the weighted answers of the margin columns match the target shares.
+    The margins are coded once in a respondent x margin matrix and each iteration
+    only uses weighted bincounts over the respondents.
+
+    Input:
+    -----
+    pd: pandas dataframe
+    columns: margin columns (e.g. [0,1] for age and activity)
+    targets: list per margin column of dictionaries {answer: target share}
+    max_iter: maximum number of iterations
+    tol: stop when all the weighted shares are within tol of the targets
+
+    Ouput:
+    -----
+    weights: weight of each respondent (mean of 1, respondents without answer to
+             a margin are not adjusted on it)
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    # respondent x margin matrix of the answer codes
+    code_mat = np.stack([Categorical(pd[list(pd)[column]], categories = list(target.keys())).codes.astype(int)
+                         for column, target in zip(columns, targets)], axis = 1)
+    target_list = [np.array(list(target.values()), dtype = float)/sum(target.values()) for target in targets]
+
+    weights = np.ones(code_mat.shape[0])
+    for iter_num in range(max_iter):
+        error = 0
+        for margin_num, target_array in enumerate(target_list):
+            codes = code_mat[:,margin_num]
+            keep = codes >= 0
+            sum_array = np.bincount(codes[keep], weights = weights[keep], minlength = target_array.size)
+            share_array = sum_array/sum_array.sum()
+            error = max(error, np.abs(share_array - target_array).max())
+
+            # answers absent from the data keep a factor of 1, as the missing answers (code -1)
+            factor_array = np.ones(target_array.size + 1)
+            factor_array[:-1] = np.divide(target_array*sum_array.sum(), sum_array, out = np.ones(target_array.size), where = sum_array > 0)
+            weights *= factor_array[codes]
+
+        if error < tol:
+            break
+
+    return weights/weights.mean()
+
+
+def weighted_n(weights):
+    """
+    Goal:
+    -----
+    Compute the effective sample size of weighted respondents (Kish)
+
+    Input:
+    -----
+    weights: weight of each respondent
+
+    Ouput:
+    -----
+    n_eff: effective number of respondents
+
+    Author:
+    -------
+    Martin Szinte (mail@martinszinte.net)
+
+    """
+
+    return weights.sum()**2/(weights**2).sum()